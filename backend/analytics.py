@@ -0,0 +1,226 @@
+"""
+Precomputed registration analytics for the admin dashboard
+
+``registration_rollups`` holds one row per event and month registered
+(``YYYY-MM`` of ``registered_at``) with the number of registrations, how
+many are confirmed/cancelled/attended, and the hours contributed. The
+mapper listeners below keep it current as registrations are written: each
+insert, update (status, event, hours) or delete adds its delta to the
+affected rows with a single upsert, in the same transaction as the write.
+
+The dashboard reads the rollup summed per event and per month in one
+query and groups the events by CAS type and club in Python, so its cost
+grows with the number of events, not registrations.
+
+Bulk ``Query.delete``/``update`` on registrations and raw SQL bypass the
+listeners (bulk event deletes call ``delete_event_rollups`` themselves). ``flask kizuna recompute-rollups`` rebuilds the table from
+event_registrations in one statement; run it after such changes, or on a
+schedule as a safety net.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import Integer, String, case, cast, func, inspect, null, select, union_all
+from sqlalchemy import event as sa_event
+from sqlalchemy.dialects import postgresql, sqlite
+from .models import db, Club, Event, EventRegistration, RegistrationRollup
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('registrations', 'confirmed', 'cancelled', 'attended', 'hours')
+STATUS_COUNTERS = ('confirmed', 'cancelled', 'attended')
+MONTHS_SHOWN = 12
+
+
+def _month(registered_at):
+    return (registered_at or datetime.utcnow()).strftime('%Y-%m')
+
+
+def _contribution(status, hours, sign=1):
+    values = {'registrations': sign, 'hours': sign * (hours or 0)}
+    for counter in STATUS_COUNTERS:
+        values[counter] = sign if status == counter else 0
+    return values
+
+
+def _apply(connection, event_id, month, deltas):
+    """Add ``deltas`` to the (event, month) rollup row, creating it if needed.
+
+    ``INSERT ... ON CONFLICT DO UPDATE`` (PostgreSQL and SQLite), so two
+    first registrations for the same row cannot both try to create it.
+    """
+    if event_id is None or not any(deltas.values()):
+        return
+    rollups = RegistrationRollup.__table__
+    insert = sqlite.insert if connection.dialect.name == 'sqlite' else postgresql.insert
+    stmt = insert(rollups).values(event_id=event_id, month=month, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollups.c.event_id, rollups.c.month],
+        set_={name: rollups.c[name] + stmt.excluded[name] for name in COUNTERS},
+    )
+    connection.execute(stmt)
+
+
+def _registration_inserted(mapper, connection, target):
+    _apply(connection, target.event_id, _month(target.registered_at),
+           _contribution(target.status, target.hours_contributed))
+
+
+def _registration_deleted(mapper, connection, target):
+    _apply(connection, target.event_id, _month(target.registered_at),
+           _contribution(target.status, target.hours_contributed, sign=-1))
+
+
+def _registration_updated(mapper, connection, target):
+    state = inspect(target)
+    histories = {name: state.attrs[name].load_history()
+                 for name in ('status', 'event_id', 'hours_contributed')}
+    if not any(history.has_changes() for history in histories.values()):
+        return
+
+    def old(name):
+        history = histories[name]
+        return history.deleted[0] if history.deleted else getattr(target, name)
+
+    month = _month(target.registered_at)
+    removed = _contribution(old('status'), old('hours_contributed'), sign=-1)
+    added = _contribution(target.status, target.hours_contributed)
+    if old('event_id') == target.event_id:
+        _apply(connection, target.event_id, month,
+               {name: removed[name] + added[name] for name in COUNTERS})
+    else:
+        _apply(connection, old('event_id'), month, removed)
+        _apply(connection, target.event_id, month, added)
+
+
+def delete_event_rollups(connection, event_ids):
+    """Remove the rollup rows of deleted events. The foreign key cascades on
+    PostgreSQL; SQLite does not enforce it, and could reuse the ids."""
+    rollups = RegistrationRollup.__table__
+    connection.execute(rollups.delete().where(rollups.c.event_id.in_(event_ids)))
+
+
+def _event_deleted(mapper, connection, target):
+    delete_event_rollups(connection, [target.id])
+
+
+def _month_expression(column, dialect):
+    if dialect == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
+
+def recompute_rollups():
+    """Rebuild registration_rollups from event_registrations.
+
+    Returns the number of rollup rows written.
+    """
+    rollups = RegistrationRollup.__table__
+    registrations = EventRegistration.__table__
+    month = _month_expression(registrations.c.registered_at, db.engine.dialect.name)
+
+    def status_count(status):
+        return func.sum(case((registrations.c.status == status, 1), else_=0))
+
+    totals = (
+        select(
+            registrations.c.event_id,
+            month,
+            func.count(registrations.c.id),
+            *(status_count(status) for status in STATUS_COUNTERS),
+            func.coalesce(func.sum(registrations.c.hours_contributed), 0),
+        )
+        .where(registrations.c.event_id.in_(select(Event.__table__.c.id)))
+        .group_by(registrations.c.event_id, month)
+    )
+    db.session.execute(rollups.delete())
+    db.session.execute(rollups.insert().from_select(['event_id', 'month', *COUNTERS], totals))
+    db.session.commit()
+    written = db.session.execute(select(func.count()).select_from(rollups)).scalar()
+    logger.info(f"Recomputed registration rollups: {written} rows")
+    return written
+
+
+def _bucket(label):
+    return {'label': label, 'events': 0, 'capacity': 0, 'capacity_filled': 0,
+            **{name: 0 for name in COUNTERS}}
+
+
+def _fill_rate(bucket):
+    if not bucket['capacity']:
+        return None
+    return bucket['capacity_filled'] / bucket['capacity']
+
+
+def _first_month_shown(now):
+    months = now.year * 12 + now.month - MONTHS_SHOWN
+    return f'{months // 12:04d}-{months % 12 + 1:02d}'
+
+
+def dashboard_stats():
+    """Totals and breakdowns for the admin dashboard, from one query.
+
+    The database sums the rollup per event and per month (the last
+    ``MONTHS_SHOWN``), so Python only sees one row per event. Fill rate is
+    confirmed plus attended registrations over capacity, for events that
+    have a ``max_capacity``. An event listing several CAS types counts
+    towards each of them.
+    """
+    rollups = RegistrationRollup.__table__
+    sums = [func.coalesce(func.sum(rollups.c[name]), 0) for name in COUNTERS]
+    per_event = (
+        select(Event.id, Event.cas_type, Event.max_capacity, Club.name, cast(null(), String), *sums)
+        .select_from(Event)
+        .outerjoin(Club, Club.id == Event.club_id)
+        .outerjoin(rollups, rollups.c.event_id == Event.id)
+        .group_by(Event.id, Club.id)
+    )
+    per_month = (
+        select(cast(null(), Integer), cast(null(), String), cast(null(), Integer), cast(null(), String),
+               rollups.c.month, *sums)
+        # Joined so rows left behind by bulk event deletes agree with per_event
+        .join(Event, Event.id == rollups.c.event_id)
+        .where(rollups.c.month >= _first_month_shown(datetime.utcnow()))
+        .group_by(rollups.c.month)
+    )
+    rows = db.session.execute(union_all(per_event, per_month)).all()
+
+    total = _bucket('All events')
+    by_cas_type, by_club, by_month = {}, {}, []
+    for event_id, cas_type, capacity, club, month, *values in rows:
+        counts = dict(zip(COUNTERS, values))
+        if event_id is None:
+            by_month.append({**_bucket(month), **counts})
+            continue
+        club = club or 'No club'
+        cas_types = [t.strip() for t in (cas_type or '').split(',') if t.strip()] or ['Unspecified']
+        buckets = [total, by_club.setdefault(club, _bucket(club))]
+        buckets += [by_cas_type.setdefault(t, _bucket(t)) for t in cas_types]
+        for bucket in buckets:
+            bucket['events'] += 1
+            for name, value in counts.items():
+                bucket[name] += value
+            if capacity:
+                bucket['capacity'] += capacity
+                bucket['capacity_filled'] += counts['confirmed'] + counts['attended']
+
+    for bucket in [total, *by_cas_type.values(), *by_club.values(), *by_month]:
+        bucket['fill_rate'] = _fill_rate(bucket)
+
+    def busiest(buckets):
+        return sorted(buckets.values(), key=lambda bucket: (-bucket['registrations'], bucket['label']))
+
+    return {
+        'total': total,
+        'by_cas_type': busiest(by_cas_type),
+        'by_club': busiest(by_club),
+        'by_month': sorted(by_month, key=lambda bucket: bucket['label'], reverse=True),
+    }
+
+
+def init_analytics(app):
+    """Keep registration_rollups current on every registration write."""
+    if not sa_event.contains(EventRegistration, 'after_insert', _registration_inserted):
+        sa_event.listen(EventRegistration, 'after_insert', _registration_inserted)
+        sa_event.listen(EventRegistration, 'after_delete', _registration_deleted)
+        sa_event.listen(EventRegistration, 'after_update', _registration_updated)
+        sa_event.listen(Event, 'after_delete', _event_deleted)
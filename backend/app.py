@@ -4,15 +4,15 @@ from flask import Flask, session, request, g, send_from_directory
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_talisman import Talisman
-from flask_compress import Compress
+from .compression import CachingCompress
 from .config import config
 from .models import db
-from .logger import setup_logging
+from .logger import new_request_id, setup_logging
 
 login_manager = LoginManager()
 csrf = CSRFProtect()
 talisman = Talisman()
-compress = Compress()
+compress = CachingCompress()
 
 # Create logger instance
 logger = logging.getLogger(__name__)
@@ -33,15 +33,33 @@ def create_app(config_name=None):
     # Setup logging
     setup_logging(app)
 
+    # Request metrics, registered first so they time every other hook
+    from .metrics import init_metrics
+    init_metrics(app)
+    from .profiler import init_profiler
+    init_profiler(app)
+
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
     compress.init_app(app)
     
-    # Initialize Flask-Mail
-    from .mail import init_mail
-    init_mail(app)
+    # Rate limiting
+    from .ratelimit import init_rate_limiter
+    init_rate_limiter(app)
+    
+    # Public page cache
+    from .cache import init_cache
+    init_cache(app)
+    
+    # Registration rollups for the admin dashboard
+    from .analytics import init_analytics
+    init_analytics(app)
+    
+    # Fingerprinted, precompressed static assets
+    from .assets import init_assets
+    init_assets(app)
     
     # Configure Talisman for security headers
     if config_name == 'production':
@@ -82,30 +100,39 @@ def create_app(config_name=None):
     login_manager.needs_refresh_message = 'Session expired. Please log in again.'
     login_manager.needs_refresh_message_category = 'warning'
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        from .models import User
-        return User.query.get(int(user_id))
+    # Logged-in users are loaded from a session snapshot, not a query per request
+    from .identity import init_identity
+    init_identity(app, login_manager)
 
     # Request logging
+    # Access lines are DEBUG unless LOG_ACCESS is set. Per-request debug calls
+    # use %-style arguments so nothing is formatted when DEBUG is off.
+    access_level = logging.INFO if app.config.get('LOG_ACCESS') else logging.DEBUG
+
     @app.before_request
     def before_request():
         g.start_time = None
+        g.request_id = new_request_id(request.headers.get('X-Request-ID'))
         if request.endpoint and not request.endpoint.startswith('static'):
             from time import time
             g.start_time = time()
-            logger.debug(f"Request: {request.method} {request.path} from {request.remote_addr}")
+            logger.debug("Request: %s %s from %s", request.method, request.path, request.remote_addr)
 
     @app.after_request
     def after_request(response):
         if hasattr(g, 'start_time') and g.start_time:
             from time import time
             duration = (time() - g.start_time) * 1000
-            logger.debug(f"Response: {request.method} {request.path} -> {response.status_code} ({duration:.2f}ms)")
+            logger.log(access_level, "Response: %s %s -> %s (%.2fms)",
+                       request.method, request.path, response.status_code, duration,
+                       extra={'status': response.status_code, 'duration_ms': round(duration, 2)})
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
         
-        if request.endpoint == 'static' or request.path.startswith('/static/'):
-            max_age = 31536000 if config_name == 'production' else 3600
-            response.cache_control.max_age = max_age
+        # Fingerprinted files (/assets/) set their own immutable caching
+        if request.endpoint == 'static':
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = app.config['STATIC_MAX_AGE']
             response.cache_control.public = True
             response.headers['X-Content-Type-Options'] = 'nosniff'
         
@@ -113,7 +140,9 @@ def create_app(config_name=None):
 
     @app.before_request
     def make_session_permanent():
-        if request.endpoint and not request.endpoint.startswith('static'):
+        # Only sessions that hold something; an empty one would be written out
+        # as a cookie for every anonymous visitor
+        if request.endpoint and not request.endpoint.startswith('static') and session and not session.permanent:
             session.permanent = True
     
     # Register blueprints
@@ -130,6 +159,10 @@ def create_app(config_name=None):
     app.register_blueprint(admin_bp)
     app.register_blueprint(newsletter_bp)
 
+    # CLI commands
+    from .cli import init_cli
+    init_cli(app)
+
     # Error handlers
     @app.errorhandler(404)
     def not_found_error(error):
@@ -158,34 +191,8 @@ def create_app(config_name=None):
         from flask import render_template
         return render_template('errors/500.html'), 500
 
-    # Create database tables and admin user
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-            
-            # Create admin user if not exists
-            from .models import User
-            admin_username = os.getenv('ADMIN_USERNAME', 'admin')
-            admin_password = os.getenv('ADMIN_PASSWORD', 'admin123')
-            
-            admin = User.query.filter_by(username=admin_username).first()
-            if not admin:
-                admin = User(
-                    username=admin_username,
-                    email='admin@kizuna.com',
-                    is_admin=True,
-                    email_verified=True
-                )
-                admin.set_password(admin_password)
-                db.session.add(admin)
-                db.session.commit()
-                logger.info(f"Admin user created: {admin_username}")
-            else:
-                logger.info("Admin user already exists")
-                
-        except Exception as e:
-            logger.error(f"Error initializing database: {e}")
+    # No database I/O here: every serverless cold start runs this factory.
+    # Schema, search index and admin user are set up by `flask kizuna init`.
 
     return app
 
@@ -0,0 +1,268 @@
+"""
+Static asset pipeline for Kizuna Platform
+
+``flask kizuna assets`` builds ``static/`` into ``static/dist/``: CSS and
+JS are minified, every file gets a content hash in its name
+(``css/style.3f9a1c2b7e.css``), text files get ``.br`` and ``.gz``
+siblings, and ``static/dist/manifest.json`` maps each source path to its
+built file. ``url()`` references between assets (the CSS font) are
+rewritten to the hashed names too.
+
+The build output is committed (Vercel's builder has no step to run the
+command), so every entry also records the SHA-256 of its source file. At
+startup entries whose source has changed since the last build are
+ignored, with a warning: those files are linked from ``/static/`` until
+``flask kizuna assets`` is run and ``static/dist`` committed again.
+
+Templates link assets with ``asset_url('css/style.css')``. With a manifest
+that is ``/assets/<hashed name>``, served by ``serve_asset``: the
+precompressed variant the client accepts, with ``Content-Encoding`` set
+(so Flask-Compress leaves it alone) and ``Cache-Control: immutable`` for a
+year, since a new build means a new URL. Without a manifest (or with
+``ASSETS_FINGERPRINT`` off, the development default) it is the plain
+``/static/`` URL, cached for ``STATIC_MAX_AGE`` only.
+
+The minifiers are deliberately simple: comments and whitespace outside
+string literals. The JS one keeps line breaks (so automatic semicolon
+insertion is unaffected) and does not recognise regex literals; use
+``new RegExp(...)`` for a pattern containing ``//`` or quotes.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from flask import abort, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional; Flask-Compress installs it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+# Already-compressed formats are fingerprinted but get no .br/.gz siblings
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 31536000
+
+_TOKENS = re.compile(
+    r'(?P<comment>/\*.*?\*/)'
+    r'|(?P<line_comment>//[^\n]*)'
+    r'|(?P<string>"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)',
+    re.S
+)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _split_code(text, line_comments):
+    """(is_string, text) pieces with comments dropped."""
+    pieces, code, position = [], [], 0
+    for match in _TOKENS.finditer(text):
+        if match.lastgroup == 'line_comment' and not line_comments:
+            continue
+        code.append(text[position:match.start()])
+        position = match.end()
+        if match.lastgroup == 'string':
+            pieces.append((False, ''.join(code)))
+            pieces.append((True, match.group()))
+            code = []
+        else:
+            code.append(' ' if match.lastgroup == 'comment' else '')
+    code.append(text[position:])
+    pieces.append((False, ''.join(code)))
+    return pieces
+
+
+def minify_css(text):
+    out = []
+    for is_string, piece in _split_code(text, line_comments=False):
+        if not is_string:
+            piece = _CSS_PUNCTUATION.sub(r'\1', re.sub(r'\s+', ' ', piece))
+        out.append(piece)
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    out = []
+    for is_string, piece in _split_code(text, line_comments=True):
+        if not is_string:
+            lines = [line.strip() for line in piece.split('\n')]
+            # Keep a piece's leading/trailing line breaks so statements stay apart
+            piece = '\n'.join(line for i, line in enumerate(lines)
+                              if line or i in (0, len(lines) - 1))
+            piece = re.sub(r'[ \t]+', ' ', piece)
+        out.append(piece)
+    return re.sub(r'\n{2,}', '\n', ''.join(out)).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _hashed_name(path, data):
+    root, ext = posixpath.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _rewrite_css_urls(text, source, manifest):
+    """Point url() references to already-built assets at their hashed files."""
+    def replace(match):
+        target = match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group()
+        if target.startswith('/static/'):
+            path = target[len('/static/'):]
+        else:
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+        entry = manifest.get(path)
+        if entry is None:
+            return match.group()
+        return f'url({match.group(1)}/assets/{entry["file"]}{match.group(1)})'
+    return _CSS_URL.sub(replace, text)
+
+
+def _compress(data):
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build_assets(static_folder, minify=True):
+    """Build ``static_folder`` into ``static_folder/dist``; returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            if not name.startswith('.'):
+                sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    # CSS last, so the files it references are already in the manifest
+    sources.sort(key=lambda path: path.endswith('.css'))
+
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        source_hash = hashlib.sha256(data).hexdigest()
+        ext = posixpath.splitext(path)[1].lower()
+        if ext == '.css':
+            data = _rewrite_css_urls(data.decode('utf-8'), path, manifest).encode('utf-8')
+        if minify and ext in MINIFIERS:
+            data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+
+        built = _hashed_name(path, data)
+        target = os.path.join(dist, *built.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+        encodings = []
+        if ext in COMPRESSIBLE:
+            variants = _compress(data)
+            for encoding, suffix in ENCODINGS:
+                # Only keep a variant that is actually smaller
+                if encoding in variants and len(variants[encoding]) < len(data):
+                    with open(target + suffix, 'wb') as f:
+                        f.write(variants[encoding])
+                    encodings.append(encoding)
+        manifest[path] = {'file': built, 'size': len(data), 'encodings': encodings, 'source': source_hash}
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable asset manifest {path}: {e}")
+        return {}
+
+
+def current_entries(static_folder, manifest):
+    """The manifest entries whose source file is unchanged since the build."""
+    current = {}
+    for path, entry in manifest.items():
+        try:
+            with open(os.path.join(static_folder, *path.split('/')), 'rb') as f:
+                source_hash = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            continue
+        if entry.get('source') == source_hash:
+            current[path] = entry
+    stale = len(manifest) - len(current)
+    if stale:
+        logger.warning(f"{stale} static file(s) changed since the last asset build; serving them "
+                       f"from /static/ until `flask kizuna assets` is run again")
+    return current
+
+
+def asset_url(filename):
+    """URL of a static file: its fingerprinted build if there is one."""
+    entry = current_app.extensions['kizuna_assets']['manifest'].get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    return url_for('static_assets', filename=entry['file'])
+
+
+def _choose_encoding(encodings):
+    accepted = {
+        part.split(';')[0].strip().lower(): 'q=0' not in part.replace(' ', '')
+        for part in request.headers.get('Accept-Encoding', '').split(',')
+    }
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and accepted.get(encoding):
+            return encoding, suffix
+    return None, ''
+
+
+def serve_asset(filename):
+    """A fingerprinted file, precompressed to match ``Accept-Encoding``."""
+    state = current_app.extensions['kizuna_assets']
+    encodings = state['built'].get(filename)
+    if encodings is None:
+        abort(404)
+
+    encoding, suffix = _choose_encoding(encodings)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(state['directory'], filename + suffix, mimetype=mimetype,
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def init_assets(app):
+    """Register ``asset_url`` for templates and the ``/assets/`` route."""
+    manifest = load_manifest(app.static_folder) if app.config.get('ASSETS_FINGERPRINT', True) else {}
+    current = current_entries(app.static_folder, manifest)
+    app.extensions['kizuna_assets'] = {
+        'manifest': current,
+        # Stale builds stay servable for pages that still link them
+        'built': {entry['file']: entry['encodings'] for entry in manifest.values()},
+        'directory': os.path.join(app.static_folder, DIST_DIR),
+    }
+    app.jinja_env.globals['asset_url'] = asset_url
+    # Named like Flask's static endpoint so the per-request hooks skip it too
+    app.add_url_rule('/assets/<path:filename>', 'static_assets', serve_asset)
+    if current:
+        logger.info(f"Serving {len(current)} fingerprinted assets")
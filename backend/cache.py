@@ -0,0 +1,353 @@
+"""
+Server-side page cache for anonymous traffic
+
+Public views opt in with ``@cached_page(*tags)``. Responses are cached per
+endpoint, view arguments and normalized query string, and only for
+anonymous GET requests that have no pending flash messages and do not
+touch the session.
+
+Tags name the data a page depends on (``'events'``, ``'clubs'``,
+``'event:{event_id}'``). Database writes are mapped to tags by session
+events and the matching pages are invalidated when the transaction
+commits, so admin create/edit/delete/bulk routes and public registrations
+invalidate without extra code.
+
+Backends (``PAGE_CACHE_BACKEND``):
+
+- ``memory``: in-process LRU with TTL. Invalidation only reaches the
+  worker that made the write; other workers serve until the TTL expires.
+- ``sql``: the ``page_cache`` table, shared by every worker/instance.
+- ``none``: disabled.
+
+The same anonymous responses are also made cacheable by browsers and a
+CDN: they never set a session cookie, and they carry ``Cache-Control:
+public, s-maxage=PUBLIC_CACHE_S_MAXAGE`` (``max-age`` stays short so
+browsers revalidate), ``Vary: Cookie`` and an ETag hashed from the body.
+A write that invalidates a page changes its ETag, so a shared cache
+revalidating after ``s-maxage`` gets the new page while unchanged pages
+cost a 304 straight from the page cache.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from functools import wraps
+from itertools import chain
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event as sa_event, or_
+from .models import db, Club, Event, EventRegistration, PageCacheEntry
+from .utils import etag_matches
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with per-entry TTL and tag index."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, tags, value)
+        self._tags = defaultdict(set)  # tag -> keys
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, tags, _ = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, tags, ttl):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, tuple(tags), value)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set(chain.from_iterable(self._tags.get(tag, ()) for tag in tags))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLCache:
+    """Cache stored in the ``page_cache`` table, shared across processes."""
+
+    name = 'sql'
+    PURGE_EVERY = 100  # sets between purges of expired rows
+
+    def __init__(self):
+        self.table = PageCacheEntry.__table__
+        self._sets = 0
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                self.table.select().where(self.table.c.key == self._hash(key),
+                                          self.table.c.expires_at > datetime.utcnow())
+            ).first()
+        return (row.body, row.mimetype) if row else None
+
+    def set(self, key, value, tags, ttl):
+        body, mimetype = value
+        now = datetime.utcnow()
+        hashed = self._hash(key)
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == hashed))
+            conn.execute(self.table.insert().values(
+                key=hashed, tags=',' + ','.join(tags) + ',', body=body, mimetype=mimetype,
+                expires_at=now + timedelta(seconds=ttl)
+            ))
+            self._sets += 1
+            if self._sets % self.PURGE_EVERY == 0:
+                conn.execute(self.table.delete().where(self.table.c.expires_at <= now))
+
+    def invalidate(self, tags):
+        with db.engine.begin() as conn:
+            result = conn.execute(self.table.delete().where(
+                or_(*[self.table.c.tags.contains(f',{tag},') for tag in tags])
+            ))
+        return result.rowcount
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete())
+
+    def __len__(self):
+        with db.engine.connect() as conn:
+            return conn.execute(
+                db.select(db.func.count()).select_from(self.table)
+            ).scalar()
+
+
+class PageCache:
+    """A cache backend plus per-endpoint hit/miss counters."""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.counters = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def count(self, endpoint, name):
+        with self._lock:
+            self.counters[endpoint][name] += 1
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Page cache read failed: {e}")
+            return None
+
+    def set(self, key, value, tags):
+        try:
+            self.backend.set(key, value, tags, self.ttl)
+        except Exception as e:
+            logger.warning(f"Page cache write failed: {e}")
+
+    def invalidate(self, tags):
+        try:
+            removed = self.backend.invalidate(tags)
+        except Exception as e:
+            logger.warning(f"Page cache invalidation failed: {e}")
+            return
+        self.count('*', 'invalidations')
+        logger.debug("Page cache invalidated %s entries for tags: %s", removed, ', '.join(sorted(tags)))
+
+    def stats(self):
+        with self._lock:
+            endpoints = {endpoint: dict(counter) for endpoint, counter in self.counters.items()}
+        for counter in endpoints.values():
+            lookups = counter.get('hits', 0) + counter.get('misses', 0)
+            if lookups:
+                counter['hit_rate'] = round(counter.get('hits', 0) / lookups, 4)
+        try:
+            size = len(self.backend)
+        except Exception:
+            size = None
+        return {'backend': self.backend.name, 'ttl': self.ttl, 'entries': size, 'endpoints': endpoints}
+
+
+def tags_for(obj):
+    """Cache tags touched by writing ``obj``."""
+    if isinstance(obj, Event):
+        return {'events'}
+    if isinstance(obj, Club):
+        return {'clubs'}
+    if isinstance(obj, EventRegistration):
+        return {f'event:{obj.event_id}'}
+    return set()
+
+
+TABLE_TAGS = {
+    Event.__table__: {'events'},
+    Club.__table__: {'clubs'},
+    EventRegistration.__table__: {'events'},
+}
+
+
+def _pending_tags(session):
+    return session.info.setdefault('page_cache_tags', set())
+
+
+def _collect_flush_tags(session, flush_context, instances):
+    pending = _pending_tags(session)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        pending.update(tags_for(obj))
+
+
+def _collect_bulk_tags(orm_execute_state):
+    # Bulk insert()/Query.update()/delete() bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _pending_tags(orm_execute_state.session).update(TABLE_TAGS.get(mapper.local_table, ()))
+
+
+def _invalidate_committed(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if not tags:
+        return
+    cache = current_app.extensions.get('kizuna_page_cache') if current_app else None
+    if cache is not None:
+        cache.invalidate(tags)
+
+
+def _discard_tags(session):
+    session.info.pop('page_cache_tags', None)
+
+
+def init_cache(app):
+    """Create the configured page cache and hook write-through invalidation."""
+    backend_name = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+    if backend_name == 'memory':
+        backend = MemoryCache(app.config.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    elif backend_name == 'sql':
+        backend = SQLCache()
+    else:
+        backend = None
+
+    app.extensions['kizuna_page_cache'] = (
+        PageCache(backend, app.config.get('PAGE_CACHE_TTL', 60)) if backend is not None else None
+    )
+
+    if not sa_event.contains(db.session, 'before_flush', _collect_flush_tags):
+        sa_event.listen(db.session, 'before_flush', _collect_flush_tags)
+        sa_event.listen(db.session, 'do_orm_execute', _collect_bulk_tags)
+        sa_event.listen(db.session, 'after_commit', _invalidate_committed)
+        sa_event.listen(db.session, 'after_soft_rollback', lambda session, previous: _discard_tags(session))
+
+
+def get_page_cache():
+    return current_app.extensions.get('kizuna_page_cache')
+
+
+def _cacheable_request():
+    return (request.method == 'GET'
+            and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+
+def page_cache_key():
+    """Endpoint + view args + query args with empty values dropped, in sorted order."""
+    view_args = sorted((request.view_args or {}).items())
+    query_args = sorted(
+        (key, value) for key, values in request.args.lists()
+        for value in values if value.strip()
+    )
+    return f'{request.endpoint}|{view_args}|{query_args}'
+
+
+def _public_response(response, body):
+    """Mark an anonymous page as shareable and answer If-None-Match with a 304."""
+    config = current_app.config
+    s_maxage = config.get('PUBLIC_CACHE_S_MAXAGE', 60)
+    if s_maxage <= 0:
+        return response
+    etag = hashlib.sha1(body).hexdigest()
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = config.get('PUBLIC_CACHE_MAX_AGE', 0)
+    response.cache_control.s_maxage = s_maxage
+    stale = config.get('PUBLIC_CACHE_STALE_WHILE_REVALIDATE', 30)
+    if stale:
+        response.cache_control['stale-while-revalidate'] = str(stale)
+    response.vary.add('Cookie')
+    if etag_matches(etag):
+        response.status_code = 304
+        response.set_data(b'')
+    return response
+
+
+def cached_page(*tags):
+    """Cache a view's response for anonymous visitors, in the page cache and
+    (with public Cache-Control and an ETag) in browsers and CDNs.
+
+    ``tags`` may use view arguments as format fields, e.g. ``'event:{event_id}'``.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not _cacheable_request():
+                return f(*args, **kwargs)
+
+            cache = get_page_cache()
+            key = page_cache_key()
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                cache.count(request.endpoint, 'hits')
+                body, mimetype = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return _public_response(response, body)
+
+            response = make_response(f(*args, **kwargs))
+            if cache is not None:
+                cache.count(request.endpoint, 'misses')
+                response.headers['X-Cache'] = 'MISS'
+            # Pages that wrote to the session (CSRF tokens, flashes) are per-visitor
+            if response.status_code != 200 or response.direct_passthrough or session.modified:
+                return response
+            body = response.get_data()
+            if cache is not None:
+                cache.set(key, (body, response.mimetype), [tag.format(**kwargs) for tag in tags])
+                cache.count(request.endpoint, 'stores')
+            return _public_response(response, body)
+        return decorated_function
+    return decorator
@@ -0,0 +1,203 @@
+"""
+Command line maintenance tasks for Kizuna Platform (``flask kizuna ...``)
+"""
+import logging
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .models import db, recount_confirmed_registrations
+
+kizuna_cli = AppGroup('kizuna', help='Kizuna maintenance commands.')
+logger = logging.getLogger(__name__)
+
+
+def init_cli(app):
+    """Register the ``kizuna`` command group with the application."""
+    app.cli.add_command(kizuna_cli)
+
+
+@kizuna_cli.command('migrate')
+@click.option('--list', 'list_only', is_flag=True, help='Only list pending migrations.')
+def migrate_command(list_only):
+    """Apply pending schema migrations (safe to run on every deploy)."""
+    from .migrations import MigrationError, pending_migrations, run_migrations
+
+    if list_only:
+        pending = pending_migrations()
+        for migration_id, description in pending:
+            click.echo(f'{migration_id}  {description}')
+        if not pending:
+            click.echo('No pending migrations')
+        return
+
+    try:
+        applied = run_migrations(on_applied=lambda migration_id: click.echo(f'Applied {migration_id}'))
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    if not applied:
+        click.echo('Database is up to date')
+
+
+def ensure_admin_user(username, password):
+    """Create the admin account if it does not exist. Returns True if it was created."""
+    from .models import User
+
+    if User.query.filter_by(username=username).first():
+        return False
+    admin = User(
+        username=username,
+        email='admin@kizuna.com',
+        is_admin=True,
+        email_verified=True
+    )
+    admin.set_password(password)
+    db.session.add(admin)
+    db.session.commit()
+    logger.info(f"Admin user created: {username}")
+    return True
+
+
+@kizuna_cli.command('init')
+@click.option('--admin-username', envvar='ADMIN_USERNAME', default='admin', show_default=True)
+@click.option('--admin-password', envvar='ADMIN_PASSWORD', default='admin123')
+def init_command(admin_username, admin_password):
+    """Set up the database: tables, migrations, search index and admin user.
+
+    Idempotent; run it once per deploy (release phase / build step) instead
+    of on every app start.
+    """
+    from .migrations import MigrationError, run_migrations
+
+    try:
+        applied = run_migrations(on_applied=lambda migration_id: click.echo(f'Applied {migration_id}'))
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    if not applied:
+        click.echo('Database is up to date')
+
+    if ensure_admin_user(admin_username, admin_password):
+        click.echo(f'Admin user created: {admin_username}')
+    else:
+        click.echo('Admin user already exists')
+
+
+@kizuna_cli.command('recount')
+@click.option('--event-id', 'event_ids', type=int, multiple=True,
+              help='Only recount these events (repeatable).')
+def recount_command(event_ids):
+    """Repair Event.confirmed_count from the registrations table."""
+    updated = recount_confirmed_registrations(list(event_ids) or None)
+    logger.info(f"Recounted confirmed registrations for {updated} event(s)")
+    click.echo(f'Recounted confirmed registrations for {updated} event(s)')
+
+
+@kizuna_cli.command('recompute-rollups')
+def recompute_rollups_command():
+    """Rebuild the registration rollups behind the admin dashboard."""
+    from .analytics import recompute_rollups
+    written = recompute_rollups()
+    click.echo(f'Recomputed {written} registration rollup row(s)')
+
+
+@kizuna_cli.command('outbox')
+@click.option('--workers', default=1, show_default=True,
+              help='Worker threads (use 1 on SQLite).')
+@click.option('--batch-size', type=int, default=None,
+              help='Emails per SMTP connection (default: OUTBOX_BATCH_SIZE).')
+@click.option('--once', is_flag=True, help='Drain currently due emails and exit.')
+@click.option('--requeue-dead', is_flag=True, help='Requeue dead-lettered emails first.')
+def outbox_command(workers, batch_size, once, requeue_dead):
+    """Deliver queued emails from the outbox."""
+    from .outbox import drain_outbox, requeue_dead as requeue, run_worker
+
+    if requeue_dead:
+        click.echo(f'Requeued {requeue()} dead-lettered email(s)')
+
+    if once:
+        click.echo(f'Processed {drain_outbox(batch_size)} outbox email(s)')
+        return
+
+    click.echo(f'Outbox worker running with {workers} thread(s); Ctrl+C to stop')
+    run_worker(current_app._get_current_object(), workers=workers, batch_size=batch_size)
+
+
+@kizuna_cli.command('newsletter')
+@click.option('--batch-size', type=int, default=None,
+              help='Recipients per SMTP connection (default: NEWSLETTER_BATCH_SIZE).')
+@click.option('--rate', type=int, default=None,
+              help='Maximum emails per second, 0 for unlimited (default: NEWSLETTER_MAX_PER_SECOND).')
+@click.option('--retry-failed', 'retry_id', type=int, default=None,
+              help='Requeue failed recipients of this newsletter ID first.')
+@click.option('--watch', is_flag=True, help='Keep polling for newly queued newsletters.')
+def newsletter_command(batch_size, rate, retry_id, watch):
+    """Send queued newsletters and resume interrupted ones."""
+    import time
+    from .models import Newsletter
+    from .newsletter import retry_failed, send_pending_newsletters
+
+    if retry_id:
+        newsletter = db.session.get(Newsletter, retry_id)
+        if newsletter is None:
+            raise click.ClickException(f'Newsletter {retry_id} not found')
+        click.echo(f'Requeued {retry_failed(newsletter)} failed recipient(s)')
+
+    while True:
+        count = send_pending_newsletters(batch_size=batch_size, max_per_second=rate)
+        if count:
+            click.echo(f'Sent {count} newsletter(s)')
+        if not watch:
+            break
+        time.sleep(current_app.config['OUTBOX_POLL_INTERVAL'])
+
+
+@kizuna_cli.command('import')
+@click.argument('kind', type=click.Choice(['events', 'clubs']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default=None,
+              help='File format (default: from the file extension).')
+@click.option('--dry-run', is_flag=True, help='Validate the rows without writing anything.')
+@click.option('--skip-invalid', is_flag=True, help='Import the valid rows even if some rows have errors.')
+def import_command(kind, path, fmt, dry_run, skip_invalid):
+    """Bulk import events or clubs from a CSV or JSON file."""
+    import time
+    from .importer import ImportFormatError, format_for, import_rows, read_rows
+
+    start = time.perf_counter()
+    with open(path, encoding='utf-8-sig') as f:
+        data = f.read()
+    try:
+        result = import_rows(kind, read_rows(data, fmt or format_for(path)),
+                             dry_run=dry_run, skip_invalid=skip_invalid)
+    except ImportFormatError as e:
+        raise click.ClickException(str(e))
+
+    for number, messages in result.errors:
+        click.echo(f'row {number}: {"; ".join(messages)}', err=True)
+    click.echo(f'{result.total} row(s) read, {result.valid} valid, {len(result.errors)} with errors, '
+               f'{result.created} imported ({time.perf_counter() - start:.2f}s)')
+    if result.created:
+        logger.info(f"Imported {result.created} {kind} from {path}")
+    if result.errors and not result.created and not dry_run:
+        raise click.ClickException('Nothing imported; fix the rows above or use --skip-invalid')
+
+
+@kizuna_cli.command('search-index')
+@click.option('--rebuild', is_flag=True, help='Rebuild the SQLite FTS index from the tables.')
+def search_index_command(rebuild):
+    """Create (or rebuild) the full-text search index."""
+    from .search import ensure_search_index
+    backend = ensure_search_index(rebuild=rebuild)
+    click.echo(f'Search backend: {backend}')
+
+
+@kizuna_cli.command('assets')
+@click.option('--no-minify', is_flag=True, help='Fingerprint and compress without minifying.')
+def assets_command(no_minify):
+    """Build minified, fingerprinted, precompressed assets into static/dist."""
+    from .assets import build_assets
+
+    manifest = build_assets(current_app.static_folder, minify=not no_minify)
+    for path, entry in sorted(manifest.items()):
+        encodings = ', '.join(entry['encodings']) or '-'
+        click.echo(f'{path} -> {entry["file"]} ({entry["size"]} bytes; {encodings})')
+    click.echo(f'{len(manifest)} asset(s) built; restart the app to serve them')
@@ -0,0 +1,140 @@
+"""
+Response compression with a cache of compressed bodies
+
+Flask-Compress compresses every HTML/JSON/CSS/JS response on every
+request, although most public responses are byte-for-byte the same
+between visitors: page-cache hits, ``/api/events`` months, unhashed static
+files. ``CachingCompress`` keeps the compressed bodies in a process-local
+LRU bounded by ``COMPRESS_CACHE_MAX_BYTES``, keyed by the SHA-1 of the
+uncompressed body plus algorithm and level, so an unchanged body is
+compressed once per worker and any change (an edit, a new build) misses.
+
+The level depends on the route class (``COMPRESS_ROUTE_LEVELS``):
+
+- ``static``: files from ``/static/``; slowest, smallest, always cached;
+- ``public``: responses marked ``Cache-Control: public`` (anonymous pages,
+  the calendar API); cached, so a higher level is paid once;
+- ``dynamic``: everything else (logged-in and admin pages, forms with CSRF
+  tokens). These bodies are unique per request, so they are compressed
+  at a fast level and not cached.
+
+Fingerprinted files under ``/assets/`` are precompressed at build time
+(``backend/assets.py``) and never reach this code.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from flask import current_app, request
+from flask_compress import Compress
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHED_CLASSES = ('static', 'public')
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU of compressed bodies, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # (digest, algorithm, level) -> bytes
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._data[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def route_class(response):
+    if request.endpoint == 'static':
+        return 'static'
+    if response.cache_control.public:
+        return 'public'
+    return 'dynamic'
+
+
+def compress_body(data, algorithm, level, config):
+    if algorithm == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if algorithm == 'br':
+        return brotli.compress(data, mode=config['COMPRESS_BR_MODE'], quality=level,
+                               lgwin=config['COMPRESS_BR_WINDOW'], lgblock=config['COMPRESS_BR_BLOCK'])
+    return zlib.compress(data, level)
+
+
+class CachingCompress(Compress):
+    """Flask-Compress with per-route-class levels and a compressed-body cache."""
+
+    def init_app(self, app):
+        super().init_app(app)
+        max_bytes = app.config.get('COMPRESS_CACHE_MAX_BYTES', 0)
+        app.extensions['kizuna_compressed_bodies'] = CompressedBodyCache(max_bytes) if max_bytes > 0 else None
+
+    def compress(self, app, response, algorithm):
+        config = app.config
+        kind = route_class(response)
+        gzip_level, br_level = config['COMPRESS_ROUTE_LEVELS'][kind]
+        level = {'gzip': gzip_level, 'br': br_level}.get(algorithm, config['COMPRESS_DEFLATE_LEVEL'])
+        data = response.get_data()
+
+        cache = current_app.extensions.get('kizuna_compressed_bodies')
+        if cache is None or kind not in CACHED_CLASSES:
+            return compress_body(data, algorithm, level, config)
+        key = (hashlib.sha1(data).digest(), algorithm, level)
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress_body(data, algorithm, level, config)
+            cache.set(key, compressed)
+        return compressed
+
+
+def compressed_cache_stats():
+    cache = current_app.extensions.get('kizuna_compressed_bodies')
+    return cache.stats() if cache is not None else None
@@ -1,7 +1,7 @@
 import os
 from datetime import timedelta
 from urllib.parse import urlparse, urlunparse
-from sqlalchemy.pool import NullPool
+from .dbpool import TimedNullPool, TimedQueuePool
 
 
 def get_database_url():
@@ -29,6 +29,11 @@ def get_bool_env(key, default=False):
     return value in ('true', '1', 'yes', 'on')
 
 
+def is_serverless():
+    """Whether we run on a serverless platform (read-only filesystem, short-lived instances)."""
+    return bool(os.getenv('VERCEL') or os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+
+
 def get_int_env(key, default):
     """Get integer value from environment variable."""
     try:
@@ -37,6 +42,51 @@ def get_int_env(key, default):
         return default
 
 
+POOL_MODES = ('nullpool', 'queue', 'pgbouncer')
+
+
+def get_pool_mode(database_url):
+    """
+    DB_POOL_MODE: nullpool, queue or pgbouncer (see backend/dbpool.py).
+    Defaults to nullpool on serverless, pgbouncer for Neon's pooled
+    (-pooler) endpoint and queue otherwise.
+    """
+    mode = os.getenv('DB_POOL_MODE', '').strip().lower()
+    if mode == 'serverless':
+        return 'nullpool'
+    if mode in POOL_MODES:
+        return mode
+    if is_serverless():
+        return 'nullpool'
+    if '-pooler' in (urlparse(database_url).hostname or ''):
+        return 'pgbouncer'
+    return 'queue'
+
+
+def get_engine_options(database_url, mode):
+    """SQLAlchemy engine options for a pool mode."""
+    if database_url.startswith('sqlite') and ':memory:' in database_url:
+        return {}  # in-memory SQLite needs SQLAlchemy's default single-connection pool
+
+    if mode == 'nullpool':
+        return {'poolclass': TimedNullPool}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': get_int_env('DB_POOL_SIZE', 5),
+        'max_overflow': get_int_env('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': get_int_env('DB_POOL_TIMEOUT', 30),  # seconds to wait for a free connection
+        'pool_recycle': get_int_env('DB_POOL_RECYCLE', 300),  # below typical server/proxy idle timeouts
+        'pool_pre_ping': True,
+        'pool_use_lifo': True,  # reuse the warmest connections; idle extras age out
+    }
+    if mode == 'pgbouncer' and database_url.startswith('postgresql'):
+        # Transaction pooling may switch servers between transactions, so
+        # psycopg must not rely on server-side prepared statements
+        options['connect_args'] = {'prepare_threshold': None}
+    return options
+
+
 class Config:
     """Base configuration with environment variable support"""
     
@@ -45,13 +95,21 @@ class Config:
     DEBUG = get_bool_env('DEBUG', False)
     TESTING = False
     
+    # Logging
+    LOG_DIR = os.getenv('LOG_DIR', 'logs')
+    LOG_TO_FILE = get_bool_env('LOG_TO_FILE', not is_serverless())
+    # Write logs from a background thread; off on serverless, where it is frozen between requests
+    LOG_QUEUE = get_bool_env('LOG_QUEUE', not is_serverless())
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text or json
+    LOG_ACCESS = get_bool_env('LOG_ACCESS', False)  # log every response at INFO
+    LOG_MAIL_DEDUP_SECONDS = get_int_env('LOG_MAIL_DEDUP_SECONDS', 600)  # same error mailed once per window
+    LOG_MAIL_MAX_PER_HOUR = get_int_env('LOG_MAIL_MAX_PER_HOUR', 10)
+    
     # Database
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = get_database_url()
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    DB_POOL_MODE = get_pool_mode(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options(SQLALCHEMY_DATABASE_URI, DB_POOL_MODE)
     
     # Session security
     SESSION_COOKIE_SECURE = get_bool_env('SESSION_COOKIE_SECURE', False)
@@ -60,11 +118,18 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(
         hours=get_int_env('SESSION_LIFETIME_HOURS', 168)  # 7 days default
     )
+    # Seconds a logged-in user's session snapshot is trusted before the row is
+    # reloaded (0 = load the user on every request). Writes and admin-only
+    # pages always reload it, so demotions apply there at once in every worker
+    USER_SESSION_TTL = get_int_env('USER_SESSION_TTL', 60)
     
     # Rate limiting
     RATE_LIMIT_ENABLED = get_bool_env('RATE_LIMIT_ENABLED', True)
+    # Login attempts per IP; 0 turns that window's limit off
     RATE_LIMIT_PER_MINUTE = get_int_env('RATE_LIMIT_PER_MINUTE', 5)
     RATE_LIMIT_PER_HOUR = get_int_env('RATE_LIMIT_PER_HOUR', 20)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # memory or sql (shared by all workers)
+    RATE_LIMIT_MAX_KEYS = get_int_env('RATE_LIMIT_MAX_KEYS', 10000)  # memory backend bound
     
     # Admin settings
     ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
@@ -79,6 +144,51 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@kizuna.local')
     
+    # Email outbox worker
+    OUTBOX_BATCH_SIZE = get_int_env('OUTBOX_BATCH_SIZE', 50)
+    OUTBOX_MAX_ATTEMPTS = get_int_env('OUTBOX_MAX_ATTEMPTS', 6)
+    OUTBOX_RETRY_BASE_SECONDS = get_int_env('OUTBOX_RETRY_BASE_SECONDS', 30)
+    OUTBOX_POLL_INTERVAL = get_int_env('OUTBOX_POLL_INTERVAL', 5)  # seconds
+    
+    # Newsletter sending
+    NEWSLETTER_BATCH_SIZE = get_int_env('NEWSLETTER_BATCH_SIZE', 500)  # recipients per SMTP connection
+    NEWSLETTER_MAX_PER_SECOND = get_int_env('NEWSLETTER_MAX_PER_SECOND', 10)
+    NEWSLETTER_LEASE_SECONDS = get_int_env('NEWSLETTER_LEASE_SECONDS', 300)  # a stalled runner's newsletter is taken over after this
+    
+    # Public page cache (memory, sql or none); see backend/cache.py
+    PAGE_CACHE_BACKEND = os.getenv('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_TTL = get_int_env('PAGE_CACHE_TTL', 60)  # seconds
+    PAGE_CACHE_MAX_ENTRIES = get_int_env('PAGE_CACHE_MAX_ENTRIES', 512)
+    # Shared (CDN) caching of the same anonymous pages; 0 disables the public headers
+    PUBLIC_CACHE_S_MAXAGE = get_int_env('PUBLIC_CACHE_S_MAXAGE', 60)
+    PUBLIC_CACHE_MAX_AGE = get_int_env('PUBLIC_CACHE_MAX_AGE', 0)  # browsers revalidate with the ETag
+    PUBLIC_CACHE_STALE_WHILE_REVALIDATE = get_int_env('PUBLIC_CACHE_STALE_WHILE_REVALIDATE', 30)
+    
+    # Request metrics; see backend/metrics.py
+    METRICS_ENABLED = get_bool_env('METRICS_ENABLED', True)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # bearer token for scrapers; admins need none
+    METRICS_DIR = os.getenv('METRICS_DIR')  # shared by the workers on a host
+    METRICS_FLUSH_SECONDS = get_int_env('METRICS_FLUSH_SECONDS', 5)
+    
+    # N+1 detection (off, warn or raise); see backend/profiler.py
+    SQL_PROFILER = os.getenv('SQL_PROFILER', 'off')
+    SQL_REPEAT_THRESHOLD = get_int_env('SQL_REPEAT_THRESHOLD', 5)  # same statement per request
+    
+    # Response compression; see backend/compression.py. Levels per route class
+    # as (gzip 1-9, brotli 0-11); static and public bodies are compressed once
+    # and cached, dynamic ones on every request
+    COMPRESS_ROUTE_LEVELS = {
+        'static': (get_int_env('COMPRESS_STATIC_LEVEL', 9), get_int_env('COMPRESS_STATIC_BR_LEVEL', 11)),
+        'public': (get_int_env('COMPRESS_PUBLIC_LEVEL', 9), get_int_env('COMPRESS_PUBLIC_BR_LEVEL', 9)),
+        'dynamic': (get_int_env('COMPRESS_DYNAMIC_LEVEL', 4), get_int_env('COMPRESS_DYNAMIC_BR_LEVEL', 3)),
+    }
+    COMPRESS_CACHE_MAX_BYTES = get_int_env('COMPRESS_CACHE_MAX_BYTES', 16 * 1024 * 1024)  # 0 disables
+    
+    # Static assets; see backend/assets.py. Fingerprinted builds are cached for
+    # a year; plain /static/ URLs keep their name across deploys, so only briefly
+    ASSETS_FINGERPRINT = get_bool_env('ASSETS_FINGERPRINT', True)
+    STATIC_MAX_AGE = get_int_env('STATIC_MAX_AGE', 3600)
+    
     # Application settings
     APP_NAME = os.getenv('APP_NAME', 'Kizuna')
     APP_URL = os.getenv('APP_URL', 'http://localhost:5001')
@@ -89,6 +199,8 @@ class Config:
     LOGIN_LOCKOUT_DURATION = get_int_env('LOGIN_LOCKOUT_DURATION', 300)  # seconds
     
     # Pagination
+    # Listing totals: estimate (planner estimate on PostgreSQL), exact or none
+    PAGINATION_COUNT = os.getenv('PAGINATION_COUNT', 'estimate')
     EVENTS_PER_PAGE = get_int_env('EVENTS_PER_PAGE', 10)
     CLUBS_PER_PAGE = get_int_env('CLUBS_PER_PAGE', 12)
     USERS_PER_PAGE = get_int_env('USERS_PER_PAGE', 20)
@@ -101,6 +213,8 @@ class DevelopmentConfig(Config):
     # Relaxed security for development
     SESSION_COOKIE_SECURE = False
     RATE_LIMIT_ENABLED = get_bool_env('RATE_LIMIT_ENABLED', False)
+    SQL_PROFILER = os.getenv('SQL_PROFILER', 'warn')
+    ASSETS_FINGERPRINT = get_bool_env('ASSETS_FINGERPRINT', False)  # edits show up without a rebuild
 
 
 class ProductionConfig(Config):
@@ -116,11 +230,6 @@ class ProductionConfig(Config):
     
     # Force HTTPS
     PREFERRED_URL_SCHEME = 'https'
-    
-    # NullPool for serverless — Neon's PgBouncer handles connection pooling
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'poolclass': NullPool,
-    }
 
 
 class TestingConfig(Config):
@@ -128,8 +237,11 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     WTF_CSRF_ENABLED = False
     RATE_LIMIT_ENABLED = False
+    SQL_PROFILER = 'raise'
+    PAGE_CACHE_BACKEND = 'none'
 
 
 config = {
@@ -0,0 +1,106 @@
+"""
+Database connection pool instrumentation for Kizuna Platform
+
+``DB_POOL_MODE`` (see ``config.get_engine_options``) picks how connections
+are managed:
+
+- ``nullpool``: open and close a connection per request. Right for
+  serverless (Vercel), where instances are short-lived and many.
+- ``queue``: keep up to ``DB_POOL_SIZE`` (+ ``DB_MAX_OVERFLOW``)
+  connections open per process, recycled after ``DB_POOL_RECYCLE``
+  seconds. Right for long-lived gunicorn workers (Render).
+- ``pgbouncer``: ``queue`` behind PgBouncer in transaction mode (e.g.
+  Neon's ``-pooler`` endpoint); psycopg's server-side prepared statements
+  are disabled since consecutive transactions may use different servers.
+
+The pool classes below time every checkout so ``pool_stats()`` can report
+connection counts and how long requests waited for a connection.
+"""
+import threading
+import time
+from sqlalchemy import event as sa_event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolStats:
+    """Checkout/connect counters for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_seconds = 0.0
+            self.max_checkout_seconds = 0.0
+            self.timeouts = 0
+            self.connects = 0
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'avg_checkout_ms': round(1000 * self.checkout_seconds / self.checkouts, 3) if self.checkouts else 0,
+                'max_checkout_ms': round(1000 * self.max_checkout_seconds, 3),
+            }
+
+
+POOL_STATS = PoolStats()
+
+
+class _TimedPoolMixin:
+    """Records how long ``connect()`` takes: waiting for a free connection,
+    opening a new one, and the pre-ping."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            POOL_STATS.record_timeout()
+            raise
+        POOL_STATS.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+class TimedNullPool(_TimedPoolMixin, NullPool):
+    pass
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+@sa_event.listens_for(TimedNullPool, 'connect')
+@sa_event.listens_for(TimedQueuePool, 'connect')
+def _connection_opened(dbapi_connection, connection_record):
+    POOL_STATS.record_connect()
+
+
+def pool_stats(engine):
+    """Pool configuration, current state and checkout statistics."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(),
+                     overflow=pool.overflow(), idle=pool.checkedin())
+    stats.update(POOL_STATS.as_dict())
+    return stats
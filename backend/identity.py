@@ -0,0 +1,169 @@
+"""
+Session-cached user identity for Kizuna Platform
+
+Flask-Login calls the user loader on every request from a logged-in user.
+Instead of loading the ``users`` row each time, the loader keeps a
+snapshot of ``id``, ``username``, ``is_admin`` and ``auth_version`` in the
+(signed) session cookie and builds a ``SessionUser`` from it. Any other
+attribute (``email``, ``registrations``, ...) loads the full row on first
+access, so code that needs it keeps working.
+
+``User.auth_version`` is bumped on password, admin-flag and username
+changes. A snapshot is dropped and the row reloaded when:
+
+- this process has committed a newer ``auth_version`` for the user,
+  deleted them, or bulk-updated ``users`` (immediate in the worker that
+  made the change);
+- it is older than ``USER_SESSION_TTL`` seconds (bounds how long other
+  workers can serve a stale identity; ``0`` disables the snapshot);
+- the request is not a GET/HEAD/OPTIONS, so every write is authorized
+  against the current row;
+- the snapshot says admin and the request is for an admin-only page (the
+  admin blueprint, ``/metrics``), so a demotion or deletion in any worker
+  locks the user out of admin pages and exports at once. Other workers
+  only learn of it through the database, so these pages always read it.
+"""
+import threading
+import time
+from flask import current_app, request, session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event as sa_event, inspect
+from .models import db, User
+
+SESSION_KEY = '_identity'
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+DELETED = 0  # auth_version starts at 1, so no snapshot ever matches this
+# Admin-only requests, which always check is_admin against the current row
+ADMIN_BLUEPRINTS = frozenset(('admin',))
+ADMIN_ENDPOINTS = frozenset(('main.metrics',))
+
+_versions = {}  # user id -> newest auth_version committed by this process
+_versions_lock = threading.Lock()
+_stale_before = 0.0  # snapshots taken before this time are reloaded
+
+
+class SessionUser(UserMixin):
+    """The logged-in user as cached in the session."""
+
+    def __init__(self, snapshot):
+        self.id = snapshot['id']
+        self.username = snapshot['username']
+        self.is_admin = snapshot['is_admin']
+        self.auth_version = snapshot['v']
+        self._user = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not in the snapshot
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                raise AttributeError(name)
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+def snapshot(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'is_admin': bool(user.is_admin),
+        'v': user.auth_version,
+        'at': time.time(),
+    }
+
+
+def _is_admin_request():
+    return request.blueprint in ADMIN_BLUEPRINTS or request.endpoint in ADMIN_ENDPOINTS
+
+
+def _is_current(snap, user_id):
+    ttl = current_app.config.get('USER_SESSION_TTL', 60)
+    if not snap or snap.get('id') != user_id or ttl <= 0:
+        return False
+    taken_at = snap.get('at', 0)
+    if request.method not in SAFE_METHODS or taken_at <= _stale_before or time.time() - taken_at >= ttl:
+        return False
+    if snap.get('is_admin') and _is_admin_request():
+        return False
+    known = _versions.get(user_id)
+    return known is None or known == snap.get('v')
+
+
+def load_user(user_id):
+    """Flask-Login user loader: the session snapshot when current, else the row."""
+    user_id = int(user_id)
+    snap = session.get(SESSION_KEY)
+    if _is_current(snap, user_id):
+        return SessionUser(snap)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        session.pop(SESSION_KEY, None)
+        return None
+    session[SESSION_KEY] = snapshot(user)
+    return user
+
+
+def _store_snapshot(sender, user, **extra):
+    session[SESSION_KEY] = snapshot(user)
+
+
+def _drop_snapshot(sender, user, **extra):
+    session.pop(SESSION_KEY, None)
+
+
+def _pending_versions(session):
+    return session.info.setdefault('auth_versions', {})
+
+
+def _collect_user_versions(session, flush_context):
+    pending = _pending_versions(session)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pending[obj.id] = DELETED
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.auth_version.history.has_changes():
+            pending[obj.id] = obj.auth_version
+
+
+def _collect_bulk_user_changes(orm_execute_state):
+    # Query.update()/delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.local_table is User.__table__:
+            orm_execute_state.session.info['auth_versions_bulk'] = True
+
+
+def _apply_committed_versions(session):
+    global _stale_before
+    pending = session.info.pop('auth_versions', None)
+    if session.info.pop('auth_versions_bulk', False):
+        # No way to tell which users a bulk statement touched: drop every
+        # snapshot taken up to now
+        _stale_before = time.time()
+    if pending:
+        with _versions_lock:
+            _versions.update(pending)
+
+
+def _discard_versions(session):
+    session.info.pop('auth_versions', None)
+    session.info.pop('auth_versions_bulk', None)
+
+
+def init_identity(app, login_manager):
+    """Use the session-cached identity as Flask-Login's user loader."""
+    app.config.setdefault('USER_SESSION_TTL', 60)
+    login_manager.user_loader(load_user)
+    user_logged_in.connect(_store_snapshot, app)
+    user_logged_out.connect(_drop_snapshot, app)
+
+    if not sa_event.contains(db.session, 'after_flush', _collect_user_versions):
+        sa_event.listen(db.session, 'after_flush', _collect_user_versions)
+        sa_event.listen(db.session, 'do_orm_execute', _collect_bulk_user_changes)
+        sa_event.listen(db.session, 'after_commit', _apply_committed_versions)
+        sa_event.listen(db.session, 'after_soft_rollback', lambda session, previous: _discard_versions(session))
@@ -0,0 +1,234 @@
+"""
+Bulk import of events and clubs from CSV or JSON
+
+Each row goes through the same ``backend/utils`` validators as the admin
+create forms and gets its own list of errors. Valid rows are written with
+batched multi-row INSERTs in one transaction. By default nothing is
+written while any row is invalid, so a corrected file can simply be
+imported again; ``skip_invalid`` writes the valid rows anyway. With
+``dry_run`` the rows are only validated.
+
+Columns (CSV header or JSON keys):
+
+- events: title, event_date, description, cas_type (``Service,Activity``
+  or ``Service;Activity``), end_time, location, max_capacity, club (name)
+  or club_id, organizer_name, organizer_email, is_published
+- clubs: name, description, meeting_day, meeting_time, meeting_location,
+  leader_name, leader_email, website_url, is_active
+
+Dates are ``YYYY-MM-DDTHH:MM`` (as in the admin form) or
+``YYYY-MM-DD HH:MM``.
+"""
+import csv
+import io
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import insert
+from .models import db, Club, Event
+from .utils import (
+    sanitize_input, validate_title, validate_description,
+    validate_cas_type, validate_integer, validate_url
+)
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('events', 'clubs')
+DATE_FORMATS = ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+BATCH_SIZE = 1000
+
+
+class ImportFormatError(Exception):
+    """Raised when the file itself cannot be read (not a row error)."""
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    total: int = 0
+    valid: int = 0
+    created: int = 0
+    dry_run: bool = False
+    errors: list = field(default_factory=list)  # (row number, [messages])
+
+
+def read_rows(data, fmt):
+    """Rows as dicts from CSV or JSON text (a list of objects)."""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames:
+            raise ImportFormatError('The CSV file has no header row')
+        return [{(k or '').strip().lower(): v for k, v in row.items()} for row in reader]
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON: {e}')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ImportFormatError('JSON imports must be a list of objects')
+        return [{str(k).strip().lower(): v for k, v in row.items()} for row in rows]
+    raise ImportFormatError(f'Unsupported format: {fmt}')
+
+
+def format_for(filename):
+    return 'json' if filename.lower().endswith('.json') else 'csv'
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def _flag(row, name, default):
+    value = _text(row, name).lower()
+    return default if not value else value in TRUE_VALUES
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def validate_event_row(row, clubs_by_name, club_ids):
+    """(values for Event, errors) for one row."""
+    errors = []
+
+    valid, title = validate_title(_text(row, 'title'))
+    if not valid:
+        errors.append(title)
+
+    valid, description = validate_description(_text(row, 'description'))
+    if not valid:
+        errors.append(description)
+
+    cas_types = [t.strip().capitalize() for t in re.split(r'[,;]', _text(row, 'cas_type')) if t.strip()]
+    valid, cas_type = validate_cas_type(cas_types)
+    if not valid:
+        errors.append(cas_type)
+
+    event_date_str = _text(row, 'event_date')
+    event_date = _parse_date(event_date_str) if event_date_str else None
+    if not event_date_str:
+        errors.append('Event date is required')
+    elif event_date is None:
+        errors.append('Invalid date format')
+
+    end_time_str = _text(row, 'end_time')
+    end_time = _parse_date(end_time_str) if end_time_str else None
+    if end_time_str and end_time is None:
+        errors.append('Invalid end time format')
+
+    valid, max_capacity = validate_integer(_text(row, 'max_capacity'), "Maximum capacity", min_val=1, max_val=10000)
+    if not valid:
+        errors.append(max_capacity)
+
+    club_id = None
+    club_name = _text(row, 'club')
+    club_id_str = _text(row, 'club_id')
+    if club_id_str:
+        valid, club_id = validate_integer(club_id_str, "Club ID", min_val=1)
+        if not valid:
+            errors.append(club_id)
+        elif club_id not in club_ids:
+            errors.append(f'Club {club_id} does not exist')
+    elif club_name:
+        club_id = clubs_by_name.get(club_name.lower())
+        if club_id is None:
+            errors.append(f"Club '{club_name}' does not exist")
+
+    if errors:
+        return None, errors
+    return {
+        'title': title,
+        'description': description,
+        'cas_type': cas_type,
+        'event_date': event_date,
+        'end_time': end_time,
+        'location': sanitize_input(_text(row, 'location'), max_length=200),
+        'max_capacity': max_capacity,
+        'club_id': club_id,
+        'organizer_name': sanitize_input(_text(row, 'organizer_name'), max_length=120),
+        'organizer_email': sanitize_input(_text(row, 'organizer_email'), max_length=120),
+        'is_published': _flag(row, 'is_published', False),
+    }, []
+
+
+def validate_club_row(row):
+    """(values for Club, errors) for one row."""
+    errors = []
+
+    valid, name = validate_title(_text(row, 'name'), max_length=120)
+    if not valid:
+        errors.append(name)
+
+    valid, description = validate_description(_text(row, 'description'))
+    if not valid:
+        errors.append(description)
+
+    valid, website_url = validate_url(_text(row, 'website_url'))
+    if not valid:
+        errors.append(website_url)
+
+    if errors:
+        return None, errors
+    return {
+        'name': name,
+        'description': description,
+        'meeting_day': sanitize_input(_text(row, 'meeting_day'), max_length=20),
+        'meeting_time': sanitize_input(_text(row, 'meeting_time'), max_length=10),
+        'meeting_location': sanitize_input(_text(row, 'meeting_location'), max_length=120),
+        'leader_name': sanitize_input(_text(row, 'leader_name'), max_length=120),
+        'leader_email': sanitize_input(_text(row, 'leader_email'), max_length=120),
+        'website_url': website_url,
+        'is_active': _flag(row, 'is_active', True),
+    }, []
+
+
+def import_rows(kind, rows, dry_run=False, skip_invalid=False, batch_size=BATCH_SIZE):
+    """Validate ``rows`` and insert the valid ones. Row numbers in errors
+    count from 1 for the first data row."""
+    if kind not in KINDS:
+        raise ImportFormatError(f'Unknown import kind: {kind}')
+    result = ImportResult(kind=kind, total=len(rows), dry_run=dry_run)
+
+    if kind == 'events':
+        # One query for every club reference in the file
+        clubs = db.session.execute(db.select(Club.id, Club.name)).all()
+        clubs_by_name = {name.lower(): club_id for club_id, name in clubs}
+        club_ids = {club_id for club_id, _ in clubs}
+        model = Event
+        validate = lambda row: validate_event_row(row, clubs_by_name, club_ids)
+    else:
+        model = Club
+        validate = validate_club_row
+
+    values = []
+    for number, row in enumerate(rows, start=1):
+        row_values, errors = validate(row)
+        if errors:
+            result.errors.append((number, errors))
+        else:
+            values.append(row_values)
+    result.valid = len(values)
+
+    if dry_run or not values or (result.errors and not skip_invalid):
+        return result
+
+    # executemany per batch (multi-row INSERT where the driver supports
+    # it), all in the session's one transaction
+    try:
+        for start in range(0, len(values), batch_size):
+            db.session.execute(insert(model), values[start:start + batch_size])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result.created = len(values)
+    return result
@@ -1,10 +1,164 @@
 """
 Logging configuration for Kizuna Platform
+
+Loggers only put records on a queue; a ``QueueListener`` thread writes them
+to the console, the log files and the error mail, so a slow disk or SMTP
+server never holds up a request. ``LOG_QUEUE`` turns this off on
+serverless platforms, where a background thread is frozen between
+invocations and would lose records.
+
+``LOG_FORMAT=json`` writes one JSON object per line with the request id
+(``X-Request-ID``) and, for access lines, the status and duration.
 """
+import atexit
+import copy
+import json
 import os
 import logging
-from logging.handlers import RotatingFileHandler, SMTPHandler
-from datetime import datetime
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request's id, method and path to every record."""
+
+    def filter(self, record):
+        from flask import g, has_request_context, request
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    FIELDS = ('request_id', 'method', 'path', 'status', 'duration_ms')
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _RenderingQueueHandler(QueueHandler):
+    """Queues a copy of the record with its message already rendered.
+
+    Arguments are formatted on the logging thread: they may be ORM objects
+    that must not be touched from the listener thread. The exception stays
+    attached so each sink formats it its own way.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class ThrottledSMTPHandler(logging.Handler):
+    """Error mail that is deduplicated and rate limited.
+
+    The same error (logger, source line and exception type) is mailed at
+    most once per ``dedup_seconds``, and no more than ``max_per_hour``
+    mails go out in total; the next mail sent says how many were
+    suppressed. The SMTPHandler is built on the first record, keeping
+    ``smtplib`` out of app start-up.
+    """
+
+    def __init__(self, config, level=logging.ERROR, dedup_seconds=600, max_per_hour=10):
+        super().__init__(level)
+        self.config = config
+        self.dedup_seconds = dedup_seconds
+        self.max_per_hour = max_per_hour
+        self._handler = None
+        self._last_sent = {}  # signature -> time last mailed
+        self._sent = deque()  # send times within the last hour
+        self._suppressed = 0
+
+    def _build(self):
+        from logging.handlers import SMTPHandler
+        config = self.config
+        handler = SMTPHandler(
+            mailhost=(config['MAIL_SERVER'], config['MAIL_PORT']),
+            fromaddr=config['MAIL_DEFAULT_SENDER'],
+            toaddrs=[config['MAIL_USERNAME']],
+            subject='Kizuna Application Error',
+            credentials=(config['MAIL_USERNAME'], config['MAIL_PASSWORD']) if config['MAIL_USERNAME'] else None,
+            secure=() if config['MAIL_USE_TLS'] else None
+        )
+        handler.setLevel(self.level)
+        handler.setFormatter(self.formatter)
+        return handler
+
+    @staticmethod
+    def signature(record):
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        return record.name, record.pathname, record.lineno, exc_type
+
+    def should_send(self, record, now=None):
+        now = time.time() if now is None else now
+        signature = self.signature(record)
+        while self._sent and self._sent[0] <= now - 3600:
+            self._sent.popleft()
+        last = self._last_sent.get(signature)
+        if (last is not None and now - last < self.dedup_seconds) or len(self._sent) >= self.max_per_hour:
+            self._suppressed += 1
+            return False
+        if len(self._last_sent) > 1000:
+            self._last_sent = {k: t for k, t in self._last_sent.items() if now - t < self.dedup_seconds}
+        self._last_sent[signature] = now
+        self._sent.append(now)
+        return True
+
+    def emit(self, record):
+        # Handler.handle() holds self.lock, so the counters need no lock of their own
+        if not self.should_send(record):
+            return
+        suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            record = copy.copy(record)
+            record.msg = f"{record.getMessage()}\n\n({suppressed} error mail(s) suppressed since the last one)"
+            record.args = None
+        if self._handler is None:
+            self._handler = self._build()
+        self._handler.emit(record)
+
+
+def new_request_id(header_value=None):
+    """The incoming X-Request-ID when it looks sane, else a new one."""
+    if header_value and REQUEST_ID_PATTERN.match(header_value):
+        return header_value
+    return os.urandom(8).hex()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def setup_logging(app):
@@ -13,12 +167,55 @@ def setup_logging(app):
     # Set log level based on environment
     log_level = logging.DEBUG if app.debug else logging.INFO
     
-    fmt = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    json_format = app.config.get('LOG_FORMAT', 'text') == 'json'
+    if json_format:
+        fmt = console_fmt = JsonFormatter()
+    else:
+        fmt = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        console_fmt = logging.Formatter('%(levelname)s: %(message)s')
 
     # Console handler (always available, works in serverless)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(log_level)
-    console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    console_handler.setFormatter(console_fmt)
+    sinks = [console_handler]
+
+    # File handlers only when filesystem is writable (off on serverless,
+    # where the platform collects stdout instead)
+    if app.config.get('LOG_TO_FILE', True):
+        from logging.handlers import RotatingFileHandler
+        log_dir = app.config.get('LOG_DIR', 'logs')
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                os.path.join(log_dir, 'kizuna.log'),
+                maxBytes=10 * 1024 * 1024,
+                backupCount=10
+            )
+            file_handler.setLevel(log_level)
+            file_handler.setFormatter(fmt)
+
+            error_handler = RotatingFileHandler(
+                os.path.join(log_dir, 'errors.log'),
+                maxBytes=10 * 1024 * 1024,
+                backupCount=10
+            )
+            error_handler.setLevel(logging.ERROR)
+            error_handler.setFormatter(fmt)
+
+            sinks += [file_handler, error_handler]
+        except OSError:
+            pass
+    
+    # Email handler for production errors
+    if not app.debug and app.config.get('MAIL_SERVER'):
+        mail_handler = ThrottledSMTPHandler(
+            app.config,
+            dedup_seconds=app.config.get('LOG_MAIL_DEDUP_SECONDS', 600),
+            max_per_hour=app.config.get('LOG_MAIL_MAX_PER_HOUR', 10),
+        )
+        mail_handler.setFormatter(fmt)
+        sinks.append(mail_handler)
 
     # Configure root logger
     root_logger = logging.getLogger()
@@ -26,46 +223,20 @@ def setup_logging(app):
 
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
+    stop_logging()
 
-    root_logger.addHandler(console_handler)
-
-    # File handlers only when filesystem is writable (not Vercel serverless)
-    log_dir = os.environ.get('LOG_DIR', 'logs')
-    try:
-        os.makedirs(log_dir, exist_ok=True)
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'kizuna.log'),
-            maxBytes=10 * 1024 * 1024,
-            backupCount=10
-        )
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(fmt)
-
-        error_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'errors.log'),
-            maxBytes=10 * 1024 * 1024,
-            backupCount=10
-        )
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(fmt)
+    if app.config.get('LOG_QUEUE', True):
+        global _listener
+        queue = SimpleQueue()
+        _listener = QueueListener(queue, *sinks, respect_handler_level=True)
+        _listener.start()
+        entry_handlers = [_RenderingQueueHandler(queue)]
+    else:
+        entry_handlers = sinks
 
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(error_handler)
-    except OSError:
-        pass
-    
-    # Email handler for production errors
-    if not app.debug and app.config.get('MAIL_SERVER'):
-        mail_handler = SMTPHandler(
-            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
-            fromaddr=app.config['MAIL_DEFAULT_SENDER'],
-            toaddrs=[app.config['MAIL_USERNAME']],
-            subject='Kizuna Application Error',
-            credentials=(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD']) if app.config['MAIL_USERNAME'] else None,
-            secure=() if app.config['MAIL_USE_TLS'] else None
-        )
-        mail_handler.setLevel(logging.ERROR)
-        root_logger.addHandler(mail_handler)
+    for handler in entry_handlers:
+        handler.addFilter(RequestContextFilter())
+        root_logger.addHandler(handler)
     
     # Set werkzeug logging (Flask development server)
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -73,6 +244,9 @@ def setup_logging(app):
     return root_logger
 
 
+atexit.register(stop_logging)
+
+
 def get_logger(name):
     """Get a logger with the given name."""
     return logging.getLogger(name)
@@ -1,42 +1,84 @@
 """
 Email utilities for Kizuna Platform
+
+Emails are not sent inside requests. Routes queue an ``EmailOutbox`` row in
+the same transaction as their own writes, and ``backend.outbox`` delivers
+the queue from a separate worker process. Flask-Mail is therefore only
+imported and set up there, on first use, keeping it out of web cold starts.
 """
+import json
 import logging
+from types import SimpleNamespace
 from flask import current_app, render_template, url_for
-from flask_mail import Mail, Message
+from .models import db, Event, EmailOutbox
 
-mail = Mail()
 logger = logging.getLogger(__name__)
 
 
-def init_mail(app):
-    """Initialize Flask-Mail with the application."""
-    mail.init_app(app)
+def get_mail():
+    """The application's Flask-Mail extension, initialized on first use."""
+    mail = current_app.extensions.get('kizuna_mail')
+    if mail is None:
+        from flask_mail import Mail
+        mail = Mail(current_app._get_current_object())
+        current_app.extensions['kizuna_mail'] = mail
+    return mail
+
+
+def mail_configured():
+    """Whether a real SMTP server is configured (otherwise emails are only logged)."""
+    server = current_app.config.get('MAIL_SERVER')
+    return bool(server) and server != 'localhost'
 
 
-def send_event_registration_email(user, event):
-    """Send event registration confirmation email."""
+def queue_event_registration_email(registration, event):
+    """Queue an event registration confirmation. The caller commits."""
     event_url = url_for('events.detail', event_id=event.id, _external=True)
-    
-    if not current_app.config.get('MAIL_SERVER') or current_app.config['MAIL_SERVER'] == 'localhost':
-        logger.info(f"Event registration: {user.email} for '{event.title}' - {event_url}")
-        return True
-    
-    try:
-        msg = Message(
-            subject=f'Registration Confirmed: {event.title} - Kizuna',
-            recipients=[user.email],
-            html=render_template('emails/event_registration.html',
-                               user=user, event=event, 
-                               event_url=event_url),
-            text=render_template('emails/event_registration.txt',
-                               user=user, event=event,
-                               event_url=event_url)
-        )
-        
-        mail.send(msg)
-        logger.info(f"Event registration email sent to {user.email}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send event registration email: {e}")
-        return False
+    outbox = EmailOutbox(
+        kind='event_registration',
+        recipient=registration.email,
+        payload=json.dumps({
+            'event_id': event.id,
+            'full_name': registration.full_name,
+            'event_url': event_url,
+        })
+    )
+    db.session.add(outbox)
+    return outbox
+
+
+def build_event_registration_message(outbox):
+    """Render the registration confirmation for an outbox row."""
+    from flask_mail import Message
+
+    payload = json.loads(outbox.payload)
+    event = db.session.get(Event, payload['event_id'])
+    if event is None:
+        return None
+
+    user = SimpleNamespace(username=payload.get('full_name'), email=outbox.recipient)
+    event_url = payload['event_url']
+    return Message(
+        subject=f'Registration Confirmed: {event.title} - Kizuna',
+        recipients=[outbox.recipient],
+        html=render_template('emails/event_registration.html',
+                           user=user, event=event,
+                           event_url=event_url),
+        body=render_template('emails/event_registration.txt',
+                           user=user, event=event,
+                           event_url=event_url)
+    )
+
+
+# Outbox kind -> function(outbox) returning a Message, or None to drop the row
+MESSAGE_BUILDERS = {
+    'event_registration': build_event_registration_message,
+}
+
+
+def build_message(outbox):
+    """Build the Flask-Mail message for an outbox row."""
+    builder = MESSAGE_BUILDERS.get(outbox.kind)
+    if builder is None:
+        raise ValueError(f"Unknown outbox email kind: {outbox.kind}")
+    return builder(outbox)
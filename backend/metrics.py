@@ -0,0 +1,443 @@
+"""
+Request metrics for Kizuna Platform
+
+Every request is recorded per endpoint: request counts by method and
+status, a latency histogram, time spent in the database and the number of
+queries, plus the number of requests in flight. ``/metrics`` serves them
+in the Prometheus text format (admins, or ``Authorization: Bearer
+$METRICS_TOKEN`` for a scraper) and ``/admin/metrics`` summarises them as
+JSON with p50/p95/p99 estimated from the histograms.
+
+Workers each keep their own registry. With ``METRICS_DIR`` set, every
+worker writes a snapshot to ``<METRICS_DIR>/<pid>-<start ms>.json`` at
+most every ``METRICS_FLUSH_SECONDS`` and on exit, and ``/metrics`` adds up
+all the snapshots in the directory, so any worker answers for the whole
+host. The start time keeps a recycled worker that gets a reused pid from
+overwriting its predecessor's totals. Snapshots of workers that have exited
+are folded into ``retired.json`` and deleted at scrape time, so counters
+never go backwards and the directory does not grow with every restart.
+Without it (e.g. on Vercel) the numbers cover the answering process only.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are read without locking and never folded
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+UNMATCHED = '<unmatched>'  # 404s and 405s, so arbitrary paths don't become labels
+RETIRED_FILE = 'retired.json'  # totals of workers that have exited
+LOCK_FILE = '.lock'
+
+
+class Histogram:
+    """Fixed-bucket histogram, mergeable across processes."""
+
+    def __init__(self, counts=None, total=0.0):
+        self.counts = list(counts) if counts else [0] * (len(BUCKETS) + 1)
+        self.sum = total
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """Estimate like PromQL's histogram_quantile: linear within the bucket."""
+        count = self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                lower = BUCKETS[i - 1] if i else 0.0
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def as_dict(self):
+        return {'counts': self.counts, 'sum': self.sum}
+
+
+class MetricsRegistry:
+    """Per-endpoint request metrics for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()  # (endpoint, method, status) -> count
+        self.latency = {}  # endpoint -> Histogram
+        self.db_time = {}  # endpoint -> Histogram
+        self.db_queries = Counter()  # endpoint -> count
+        self.in_flight = 0
+        self.last_flush = 0.0
+        self._instance = None  # (pid, instance id)
+
+    @property
+    def instance(self):
+        """``<pid>-<start ms>``, unique even when the OS reuses a pid. Made
+        lazily, so workers forked from a preloaded master get their own."""
+        pid = os.getpid()
+        if self._instance is None or self._instance[0] != pid:
+            self._instance = (pid, f'{pid}-{time.time_ns() // 1_000_000}')
+        return self._instance[1]
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, endpoint, method, status, seconds, db_seconds, db_queries):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(endpoint, method, status)] += 1
+            self.latency.setdefault(endpoint, Histogram()).observe(seconds)
+            self.db_time.setdefault(endpoint, Histogram()).observe(db_seconds)
+            self.db_queries[endpoint] += db_queries
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'instance': self.instance,
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'latency': {endpoint: h.as_dict() for endpoint, h in self.latency.items()},
+                'db_time': {endpoint: h.as_dict() for endpoint, h in self.db_time.items()},
+                'db_queries': dict(self.db_queries),
+                'in_flight': self.in_flight,
+            }
+
+    def merge(self, snapshot, include_in_flight=True):
+        """Add another process's snapshot into this registry."""
+        with self._lock:
+            for endpoint, method, status, count in snapshot['requests']:
+                self.requests[(endpoint, method, status)] += count
+            for name in ('latency', 'db_time'):
+                histograms = getattr(self, name)
+                for endpoint, data in snapshot[name].items():
+                    histograms.setdefault(endpoint, Histogram()).merge(Histogram(data['counts'], data['sum']))
+            self.db_queries.update(snapshot['db_queries'])
+            if include_in_flight:
+                self.in_flight += snapshot['in_flight']
+
+    def write(self, directory):
+        """Atomically replace this process's snapshot file."""
+        _write_json(os.path.join(directory, f'{self.instance}.json'), self.snapshot())
+        self.last_flush = time.time()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Skipping unreadable metrics snapshot {path}: {e}")
+        return None
+
+
+def _worker_snapshots(directory):
+    """(path, instance id, snapshot) of every worker snapshot in ``directory``."""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        name = os.path.basename(path)
+        if name == RETIRED_FILE:
+            continue
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            yield path, snapshot.get('instance') or name[:-len('.json')], snapshot
+
+
+@contextmanager
+def _locked(directory, exclusive):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def retire_exited_workers(directory):
+    """Fold the snapshots of exited workers into ``retired.json`` and delete them.
+
+    ``retired.json`` lists the instances it already holds, so a crash
+    between writing it and deleting their files never counts them twice.
+    Returns the number of snapshots folded.
+    """
+    if fcntl is None:
+        return 0
+    path = os.path.join(directory, RETIRED_FILE)
+    with _locked(directory, exclusive=True):
+        previous = _read_snapshot(path) or {}
+        retired = MetricsRegistry()
+        if previous:
+            retired.merge(previous, include_in_flight=False)
+        # Only ids whose file may still exist need remembering
+        folded = {instance for instance in previous.get('folded', ())
+                  if os.path.exists(os.path.join(directory, f'{instance}.json'))}
+        exited = []
+        for snapshot_path, instance, snapshot in _worker_snapshots(directory):
+            if _pid_alive(snapshot.get('pid', 0)):
+                continue
+            if instance not in folded:
+                retired.merge(snapshot, include_in_flight=False)
+                folded.add(instance)
+            exited.append(snapshot_path)
+        if not exited:
+            return 0
+        data = retired.snapshot()
+        data.update(pid=None, instance=None, in_flight=0, folded=sorted(folded))
+        _write_json(path, data)
+        for snapshot_path in exited:
+            try:
+                os.remove(snapshot_path)
+            except FileNotFoundError:
+                pass
+    return len(exited)
+
+
+def collect(directory=None):
+    """This process's metrics, plus every other worker's snapshot in ``directory``.
+
+    Counters from workers that have exited are kept (they are totals, folded
+    into ``retired.json``); their in-flight gauge is not.
+    """
+    combined = MetricsRegistry()
+    combined.merge(REGISTRY.snapshot())
+    if not directory:
+        return combined
+    retire_exited_workers(directory)
+    with _locked(directory, exclusive=False):
+        retired = _read_snapshot(os.path.join(directory, RETIRED_FILE)) or {}
+        if retired:
+            combined.merge(retired, include_in_flight=False)
+        folded = set(retired.get('folded', ()))
+        for _, instance, snapshot in _worker_snapshots(directory):
+            if instance == REGISTRY.instance or instance in folded:
+                continue
+            combined.merge(snapshot, include_in_flight=_pid_alive(snapshot.get('pid', 0)))
+    return combined
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histograms):
+    lines = []
+    for endpoint, h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, n in zip((*BUCKETS, '+Inf'), h.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {h.sum:.6f}')
+        lines.append(f'{name}_count{_labels(endpoint=endpoint)} {h.count}')
+    return lines
+
+
+def render_prometheus(registry):
+    """The registry in the Prometheus text exposition format (0.0.4)."""
+    lines = [
+        '# HELP kizuna_http_requests_total Requests served, by endpoint, method and status.',
+        '# TYPE kizuna_http_requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(registry.requests.items()):
+        lines.append(f'kizuna_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP kizuna_http_request_duration_seconds Request latency.',
+        '# TYPE kizuna_http_request_duration_seconds histogram',
+        *_histogram_lines('kizuna_http_request_duration_seconds', registry.latency),
+        '# HELP kizuna_http_request_duration_quantile_seconds Latency quantiles estimated from the histogram.',
+        '# TYPE kizuna_http_request_duration_quantile_seconds gauge',
+    ]
+    for endpoint, h in sorted(registry.latency.items()):
+        for q in QUANTILES:
+            lines.append(f'kizuna_http_request_duration_quantile_seconds'
+                         f'{_labels(endpoint=endpoint, quantile=q)} {h.quantile(q):.6f}')
+
+    lines += [
+        '# HELP kizuna_db_duration_seconds Time spent in database queries per request.',
+        '# TYPE kizuna_db_duration_seconds histogram',
+        *_histogram_lines('kizuna_db_duration_seconds', registry.db_time),
+        '# HELP kizuna_db_queries_total Database queries issued by requests.',
+        '# TYPE kizuna_db_queries_total counter',
+    ]
+    for endpoint, count in sorted(registry.db_queries.items()):
+        lines.append(f'kizuna_db_queries_total{_labels(endpoint=endpoint)} {count}')
+
+    lines += [
+        '# HELP kizuna_http_requests_in_flight Requests currently being served.',
+        '# TYPE kizuna_http_requests_in_flight gauge',
+        f'kizuna_http_requests_in_flight {registry.in_flight}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def summary(registry):
+    """Per-endpoint request count, error count, latency quantiles and DB cost."""
+    errors = Counter()
+    for (endpoint, _, status), count in registry.requests.items():
+        if int(status) >= 500:
+            errors[endpoint] += count
+    endpoints = {}
+    for endpoint, h in sorted(registry.latency.items()):
+        db = registry.db_time.get(endpoint, Histogram())
+        endpoints[endpoint] = {
+            'requests': h.count,
+            'errors': errors[endpoint],
+            **{f'p{int(q * 100)}_ms': round(h.quantile(q) * 1000, 2) for q in QUANTILES},
+            'avg_ms': round(1000 * h.sum / h.count, 2),
+            'avg_db_ms': round(1000 * db.sum / h.count, 2),
+            'queries_per_request': round(registry.db_queries[endpoint] / h.count, 2),
+        }
+    return {'in_flight': registry.in_flight, 'endpoints': endpoints}
+
+
+# The one Engine-wide query timer. Database time is accumulated on ``g`` for
+# the request that issued the query, and every observer added in the current
+# context (the SQL profiler's query logs) gets ``(statement, seconds)``.
+_query_observers = ContextVar('kizuna_query_observers', default=())
+
+
+def add_query_observer(observer):
+    """Call ``observer(statement, seconds)`` after each query run in this
+    context. Returns a token for ``remove_query_observer``."""
+    install_query_timer()
+    return _query_observers.set(_query_observers.get() + (observer,))
+
+
+def remove_query_observer(token):
+    _query_observers.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('kizuna_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('kizuna_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_app_context() and 'metrics_db_time' in g:
+        g.metrics_db_time += elapsed
+        g.metrics_db_queries += 1
+    for observer in _query_observers.get():
+        observer(statement, elapsed)
+
+
+def _handle_db_error(exception_context):
+    starts = exception_context.connection.info.get('kizuna_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_time = 0.0
+    g.metrics_db_queries = 0
+    REGISTRY.start()
+
+
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exception):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    endpoint = request.endpoint or UNMATCHED
+    status = g.get('metrics_status', 500)
+    REGISTRY.finish(endpoint, request.method, str(status), time.perf_counter() - start,
+                    g.get('metrics_db_time', 0.0), g.get('metrics_db_queries', 0))
+
+    directory = current_app.config.get('METRICS_DIR')
+    if directory and time.time() - REGISTRY.last_flush >= current_app.config.get('METRICS_FLUSH_SECONDS', 5):
+        flush(directory)
+
+
+def flush(directory):
+    try:
+        REGISTRY.write(directory)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot to {directory}: {e}")
+
+
+def init_metrics(app):
+    """Record every request in the process-wide registry."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(flush, directory)
+
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+    install_query_timer()
+
+
+def install_query_timer():
+    if not sa_event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        sa_event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        sa_event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        sa_event.listen(Engine, 'handle_error', _handle_db_error)
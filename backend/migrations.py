@@ -0,0 +1,187 @@
+"""
+Schema migrations for Kizuna Platform
+
+``db.create_all()`` only creates missing tables, so changes to existing
+tables (new columns, indexes, constraints) are applied here, in order, by
+``flask kizuna migrate``. Applied migration ids are recorded in the
+``schema_migrations`` table and every migration is idempotent, so a fresh
+database built by ``create_all`` can be migrated safely too.
+
+Indexes are built with ``CREATE INDEX CONCURRENTLY`` on PostgreSQL so
+production tables stay writable while they build.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+from .models import db, recount_confirmed_registrations
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('id', String(100), primary_key=True),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+class MigrationError(Exception):
+    """Raised when a migration cannot be applied safely."""
+
+
+def migration(migration_id, description):
+    """Register a migration function. Migrations run in registration order."""
+    def decorator(f):
+        MIGRATIONS.append((migration_id, description, f))
+        return f
+    return decorator
+
+
+def _column_names(table_name):
+    return {c['name'] for c in inspect(db.engine).get_columns(table_name)}
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def add_column(table_name, column_name, ddl):
+    """Add a column if it does not exist yet. ``ddl`` is the column type and options."""
+    if column_name in _column_names(table_name):
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}'))
+    return True
+
+
+def create_index(name, table_name, columns, unique=False, using=None):
+    """Create an index without blocking writes (CONCURRENTLY on PostgreSQL).
+
+    ``columns`` may include parenthesised expressions; ``using`` is the
+    PostgreSQL access method (``'GIN'``).
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    using_sql = f' USING {using}' if using else ''
+    column_sql = ', '.join(columns)
+
+    if not _is_postgres():
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table_name} ({column_sql})'
+            ))
+        return
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        # A failed concurrent build leaves an INVALID index behind; rebuild it
+        invalid = conn.execute(text(
+            'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE c.relname = :name AND NOT i.indisvalid'
+        ), {'name': name}).first()
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        conn.execute(text(
+            f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table_name}{using_sql} ({column_sql})'
+        ))
+
+
+@migration('0001_event_confirmed_count', 'Add events.confirmed_count and backfill it')
+def _event_confirmed_count():
+    add_column('events', 'confirmed_count', 'INTEGER NOT NULL DEFAULT 0')
+    recount_confirmed_registrations()
+
+
+@migration('0002_registration_unique_email', 'Unique (event_id, email) on event_registrations')
+def _registration_unique_email():
+    with db.engine.connect() as conn:
+        duplicates = conn.execute(text(
+            'SELECT event_id, email, COUNT(*) FROM event_registrations '
+            'GROUP BY event_id, email HAVING COUNT(*) > 1 LIMIT 5'
+        )).all()
+    if duplicates:
+        sample = ', '.join(f'event {event_id}: {email} x{count}' for event_id, email, count in duplicates)
+        raise MigrationError(
+            f'Duplicate registrations must be removed before adding the unique index ({sample})'
+        )
+    create_index('uq_event_registrations_event_email', 'event_registrations',
+                 ['event_id', 'email'], unique=True)
+
+
+@migration('0003_hot_query_indexes', 'Composite indexes for listing, calendar and participant queries')
+def _hot_query_indexes():
+    create_index('ix_events_published_date', 'events', ['is_published', 'event_date'])
+    create_index('ix_events_club_date', 'events', ['club_id', 'event_date'])
+    create_index('ix_event_registrations_event_status', 'event_registrations', ['event_id', 'status'])
+    create_index('ix_event_registrations_event_registered', 'event_registrations', ['event_id', 'registered_at'])
+    create_index('ix_clubs_active_meeting_day', 'clubs', ['is_active', 'meeting_day'])
+
+
+@migration('0004_search_index', 'Full-text search index for events and clubs')
+def _search_index():
+    from .search import ensure_search_index
+    ensure_search_index()
+
+
+@migration('0005_user_auth_version', 'Add users.auth_version for session identity invalidation')
+def _user_auth_version():
+    add_column('users', 'auth_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+@migration('0006_keyset_indexes', 'Indexes on the keyset pagination orderings of events and clubs')
+def _keyset_indexes():
+    create_index('ix_events_published_date_id', 'events', ['is_published', 'event_date', 'id'])
+    create_index('ix_events_date_id', 'events', ['event_date', 'id'])
+    create_index('ix_clubs_name_id', 'clubs', ['name', 'id'])
+
+
+@migration('0007_registration_rollups', 'Backfill registration_rollups for the admin dashboard')
+def _registration_rollups():
+    from .analytics import recompute_rollups
+    recompute_rollups()
+
+
+@migration('0008_search_expression_index',
+           'Search: GIN expression indexes instead of stored search_vector columns; '
+           'FTS update triggers on indexed columns only')
+def _search_expression_index():
+    from .search import ensure_search_index
+    ensure_search_index()
+
+
+@migration('0009_newsletter_lease', 'Add newsletters.lease_expires_at so one runner sends each newsletter')
+def _newsletter_lease():
+    add_column('newsletters', 'lease_expires_at', 'TIMESTAMP')
+
+
+def applied_migrations():
+    """Ids of migrations already applied to the database."""
+    schema_migrations.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        return {row.id for row in conn.execute(schema_migrations.select())}
+
+
+def pending_migrations():
+    """(id, description) of migrations not yet applied, in order."""
+    applied = applied_migrations()
+    return [(mid, description) for mid, description, _ in MIGRATIONS if mid not in applied]
+
+
+def run_migrations(on_applied=None):
+    """Apply every pending migration in order, calling ``on_applied(id)`` after
+    each one. Returns the ids applied."""
+    db.create_all()
+    applied = applied_migrations()
+    done = []
+    for migration_id, description, f in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        logger.info(f"Applying migration {migration_id}: {description}")
+        f()
+        with db.engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(id=migration_id, applied_at=datetime.utcnow()))
+        done.append(migration_id)
+        if on_applied:
+            on_applied(migration_id)
+    return done
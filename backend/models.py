@@ -1,11 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event as sa_event, func, inspect, or_, select
+from sqlalchemy.orm import column_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
 db = SQLAlchemy()
 
 
+class EventFullError(Exception):
+    """Raised during flush when a confirmed registration would exceed max_capacity."""
+
+    def __init__(self, event_id):
+        super().__init__(f'Event {event_id} is at full capacity')
+        self.event_id = event_id
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
@@ -16,6 +26,8 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     email_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever cached session identities must be dropped (see identity.py)
+    auth_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     registrations = db.relationship('EventRegistration', backref='user', lazy=True, cascade='all, delete-orphan')
     newsletter_subscription = db.relationship('NewsletterSubscription', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -32,6 +44,10 @@ class User(UserMixin, db.Model):
 
 class Club(db.Model):
     __tablename__ = 'clubs'
+    __table_args__ = (
+        db.Index('ix_clubs_active_meeting_day', 'is_active', 'meeting_day'),
+        db.Index('ix_clubs_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -55,6 +71,12 @@ class Club(db.Model):
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_published_date', 'is_published', 'event_date'),
+        db.Index('ix_events_club_date', 'club_id', 'event_date'),
+        db.Index('ix_events_published_date_id', 'is_published', 'event_date', 'id'),
+        db.Index('ix_events_date_id', 'event_date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -68,6 +90,9 @@ class Event(db.Model):
     organizer_name = db.Column(db.String(120))
     organizer_email = db.Column(db.String(120))
     is_published = db.Column(db.Boolean, default=False)
+    # Denormalized count of confirmed registrations, maintained by the
+    # EventRegistration mapper events below. Repair with `flask kizuna recount`.
+    confirmed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -79,7 +104,7 @@ class Event(db.Model):
         return self.get_registered_count() >= self.max_capacity
 
     def get_registered_count(self):
-        return EventRegistration.query.filter_by(event_id=self.id, status='confirmed').count()
+        return self.confirmed_count or 0
 
     def __repr__(self):
         return f'<Event {self.title}>'
@@ -87,15 +112,22 @@ class Event(db.Model):
 
 class EventRegistration(db.Model):
     __tablename__ = 'event_registrations'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'email', name='uq_event_registrations_event_email'),
+        db.Index('ix_event_registrations_event_status', 'event_id', 'status'),
+        db.Index('ix_event_registrations_event_registered', 'event_id', 'registered_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    # active_history so the confirmed_count listeners can see the previous value
+    event_id = column_property(db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False), active_history=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     full_name = db.Column(db.String(120))
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
-    status = db.Column(db.String(20), default='confirmed')  # confirmed, cancelled, attended
-    hours_contributed = db.Column(db.Float, default=0)
+    status = column_property(db.Column(db.String(20), default='confirmed'), active_history=True)  # confirmed, cancelled, attended
+    # active_history so the analytics rollup listeners can see the previous value
+    hours_contributed = column_property(db.Column(db.Float, default=0), active_history=True)
     notes = db.Column(db.Text)
     registered_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -103,6 +135,24 @@ class EventRegistration(db.Model):
         return f'<EventRegistration {self.full_name} - {self.event_id}>'
 
 
+class RegistrationRollup(db.Model):
+    """Registration totals per event and month registered, kept current by the
+    listeners in ``backend/analytics.py`` so the admin dashboard never scans
+    event_registrations. Rebuild with ``flask kizuna recompute-rollups``."""
+    __tablename__ = 'registration_rollups'
+
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM of registered_at
+    registrations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    confirmed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    cancelled = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attended = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hours = db.Column(db.Float, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<RegistrationRollup {self.event_id} {self.month}>'
+
+
 class NewsletterSubscription(db.Model):
     __tablename__ = 'newsletter_subscriptions'
 
@@ -113,3 +163,177 @@ class NewsletterSubscription(db.Model):
 
     def __repr__(self):
         return f'<NewsletterSubscription {self.user_id}>'
+
+
+
+
+class Newsletter(db.Model):
+    __tablename__ = 'newsletters'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='draft')  # draft, queued, sending, sent
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)  # while sending: when another runner may take it over
+
+    deliveries = db.relationship('NewsletterDelivery', backref='newsletter', lazy='dynamic', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<Newsletter {self.subject}>'
+
+
+class NewsletterDelivery(db.Model):
+    """Per-recipient delivery state, so an interrupted send resumes where it stopped."""
+    __tablename__ = 'newsletter_deliveries'
+    __table_args__ = (
+        db.UniqueConstraint('newsletter_id', 'subscription_id', name='uq_newsletter_deliveries_recipient'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    newsletter_id = db.Column(db.Integer, db.ForeignKey('newsletters.id'), nullable=False)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('newsletter_subscriptions.id'), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # sending, sent, failed
+    error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NewsletterDelivery {self.newsletter_id} -> {self.email} ({self.status})>'
+
+
+class EmailOutbox(db.Model):
+    """Outgoing email, written in the same transaction as the change that triggers it
+    and delivered by the outbox worker (``flask kizuna outbox``)."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # e.g. event_registration
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.kind} -> {self.recipient} ({self.status})>'
+
+
+class PageCacheEntry(db.Model):
+    """Rendered public page, used by the ``sql`` page cache backend."""
+    __tablename__ = 'page_cache'
+
+    key = db.Column(db.String(40), primary_key=True)  # sha1 of the cache key
+    tags = db.Column(db.Text, nullable=False, default='')  # ",tag1,tag2,"
+    body = db.Column(db.LargeBinary, nullable=False)
+    mimetype = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<PageCacheEntry {self.key}>'
+
+
+class RateLimitCounter(db.Model):
+    """Sliding-window counter for one (key, window), used by the ``sql`` rate limit backend."""
+    __tablename__ = 'rate_limits'
+
+    key = db.Column(db.String(255), primary_key=True)  # "<key>|<window seconds>"
+    window_id = db.Column(db.BigInteger, nullable=False)  # start of the current window // window
+    count = db.Column(db.Integer, nullable=False, default=0)
+    previous = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RateLimitCounter {self.key}: {self.count}>'
+
+
+@sa_event.listens_for(User, 'before_update')
+def _bump_auth_version(mapper, connection, target):
+    state = inspect(target)
+    if (state.attrs.password_hash.history.has_changes()
+            or state.attrs.is_admin.history.has_changes()
+            or state.attrs.username.history.has_changes()):
+        target.auth_version = (target.auth_version or 1) + 1
+
+
+def _adjust_confirmed_count(connection, event_id, delta):
+    if not event_id or not delta:
+        return
+    events = Event.__table__
+    stmt = (
+        events.update()
+        .where(events.c.id == event_id)
+        # A counter is not an edit: keep updated_at (and the calendar ETag) as is
+        .values(confirmed_count=events.c.confirmed_count + delta, updated_at=events.c.updated_at)
+    )
+    if delta > 0:
+        # Conditional update: the row lock taken here (PostgreSQL) or the
+        # database write lock (SQLite) makes check-and-reserve atomic.
+        stmt = stmt.where(or_(
+            events.c.max_capacity.is_(None),
+            events.c.confirmed_count + delta <= events.c.max_capacity,
+        ))
+    result = connection.execute(stmt)
+    if delta > 0 and result.rowcount == 0:
+        raise EventFullError(event_id)
+
+
+@sa_event.listens_for(EventRegistration, 'after_insert')
+def _registration_inserted(mapper, connection, target):
+    if target.status == 'confirmed':
+        _adjust_confirmed_count(connection, target.event_id, 1)
+
+
+@sa_event.listens_for(EventRegistration, 'after_delete')
+def _registration_deleted(mapper, connection, target):
+    if target.status == 'confirmed':
+        _adjust_confirmed_count(connection, target.event_id, -1)
+
+
+@sa_event.listens_for(EventRegistration, 'after_update')
+def _registration_updated(mapper, connection, target):
+    state = inspect(target)
+    status_hist = state.attrs.status.load_history()
+    event_hist = state.attrs.event_id.load_history()
+    if not status_hist.has_changes() and not event_hist.has_changes():
+        return
+
+    old_status = status_hist.deleted[0] if status_hist.deleted else target.status
+    old_event_id = event_hist.deleted[0] if event_hist.deleted else target.event_id
+
+    if old_status == 'confirmed':
+        _adjust_confirmed_count(connection, old_event_id, -1)
+    if target.status == 'confirmed':
+        _adjust_confirmed_count(connection, target.event_id, 1)
+
+
+def recount_confirmed_registrations(event_ids=None):
+    """Recompute Event.confirmed_count from event_registrations.
+
+    Returns the number of events updated. Bulk ``Query.delete``/``update``
+    calls bypass the mapper events above, so run this after any of those.
+    """
+    events = Event.__table__
+    registrations = EventRegistration.__table__
+    confirmed = (
+        select(func.count(registrations.c.id))
+        .where(registrations.c.event_id == events.c.id,
+               registrations.c.status == 'confirmed')
+        .scalar_subquery()
+    )
+    stmt = events.update().values(confirmed_count=confirmed, updated_at=events.c.updated_at)
+    if event_ids:
+        stmt = stmt.where(events.c.id.in_(event_ids))
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,285 @@
+"""
+Newsletter send engine for Kizuna Platform
+
+Admins queue a ``Newsletter`` from the admin panel; ``flask kizuna newsletter``
+delivers it. Templates are rendered once per newsletter and only the
+recipient name is substituted per message. Active subscribers are read in
+keyset-ordered chunks and each chunk is sent over one SMTP connection.
+
+A runner takes a newsletter with one conditional UPDATE and holds it by a
+lease (``NEWSLETTER_LEASE_SECONDS``) renewed as it goes, so only one runner
+sends it; another resumes it if the lease expires. Recipients are claimed
+``CLAIM_SIZE`` at a time with ``sending`` delivery rows committed before
+the emails go out, and marked ``sent``/``failed`` right after, so a crash
+leaves at most one claim unaccounted for (marked failed, not resent) and
+an interrupted run picks up where it stopped.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from string import Template
+from markupsafe import escape
+from flask import current_app, render_template
+from flask_mail import Message
+from sqlalchemy import and_, bindparam, func, insert, or_, select
+from .models import db, Newsletter, NewsletterDelivery, NewsletterSubscription, User
+from .mail import get_mail, mail_configured
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SIZE = 20  # recipients claimed, sent and recorded per transaction
+
+
+class RateLimiter:
+    """Pace calls to at most ``per_second`` per second (0 disables pacing)."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def render_newsletter(newsletter):
+    """Render the newsletter templates once, leaving ``${name}`` for each recipient."""
+    # Both go through safe_substitute below, so escape their own $ signs
+    subject = newsletter.subject.replace('$', '$$')
+    body = newsletter.body.replace('$', '$$')
+    context = dict(subject=subject, body=body, recipient_name='${name}',
+                   app_url=current_app.config['APP_URL'])
+    html = render_template('emails/newsletter.html', **context)
+    text = render_template('emails/newsletter.txt', **context)
+    return Template(html), Template(text)
+
+
+def pending_recipients(newsletter_id, after_id, limit):
+    """Next chunk of active subscribers without a delivery row for this newsletter."""
+    delivered = select(NewsletterDelivery.id).where(
+        NewsletterDelivery.newsletter_id == newsletter_id,
+        NewsletterDelivery.subscription_id == NewsletterSubscription.id,
+    )
+    stmt = (
+        select(NewsletterSubscription.id, User.email, User.username)
+        .join(User, User.id == NewsletterSubscription.user_id)
+        .where(NewsletterSubscription.is_active.is_(True),
+               NewsletterSubscription.id > after_id,
+               ~delivered.exists())
+        .order_by(NewsletterSubscription.id)
+        .limit(limit)
+    )
+    return db.session.execute(stmt).all()
+
+
+def _acquire(newsletter_id, lease_seconds):
+    """Take the newsletter if it is queued, or sending with an expired lease.
+
+    A single conditional UPDATE, so when several runners (``--watch`` plus
+    cron, two workers) race for it exactly one wins. Returns the lease
+    expiry on success, None if another runner holds it.
+    """
+    newsletters = Newsletter.__table__
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=lease_seconds)
+    result = db.session.execute(
+        newsletters.update()
+        .where(newsletters.c.id == newsletter_id,
+               or_(newsletters.c.status == 'queued',
+                   and_(newsletters.c.status == 'sending',
+                        or_(newsletters.c.lease_expires_at.is_(None),
+                            newsletters.c.lease_expires_at < now))))
+        .values(status='sending', lease_expires_at=expires,
+                started_at=func.coalesce(newsletters.c.started_at, now))
+    )
+    db.session.commit()
+    return expires if result.rowcount == 1 else None
+
+
+def _renew(newsletter_id, lease, lease_seconds, sent=0, failed=0):
+    """Extend our lease (and add to the counters) if we still hold it.
+
+    Returns the new expiry, or None if the lease was lost to another runner.
+    Not committed: the caller commits it together with the delivery rows.
+    """
+    newsletters = Newsletter.__table__
+    expires = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    result = db.session.execute(
+        newsletters.update()
+        .where(newsletters.c.id == newsletter_id, newsletters.c.lease_expires_at == lease)
+        .values(lease_expires_at=expires,
+                sent_count=newsletters.c.sent_count + sent,
+                failed_count=newsletters.c.failed_count + failed)
+    )
+    return expires if result.rowcount == 1 else None
+
+
+def _fail_interrupted(newsletter_id):
+    """Mark deliveries a crashed runner claimed but never recorded as failed.
+
+    Whether those emails went out is unknown, so they are not resent
+    automatically; ``--retry-failed`` sends them again if wanted.
+    """
+    deliveries = NewsletterDelivery.__table__
+    newsletters = Newsletter.__table__
+    count = db.session.execute(
+        deliveries.update()
+        .where(deliveries.c.newsletter_id == newsletter_id, deliveries.c.status == 'sending')
+        .values(status='failed', error='Interrupted while sending; delivery unknown')
+    ).rowcount
+    if count:
+        db.session.execute(
+            newsletters.update().where(newsletters.c.id == newsletter_id)
+            .values(failed_count=newsletters.c.failed_count + count)
+        )
+        logger.warning(f"Newsletter {newsletter_id}: {count} delivery(ies) interrupted by an earlier run marked failed")
+    db.session.commit()
+
+
+def _claim(newsletter_id, recipients):
+    db.session.execute(insert(NewsletterDelivery), [
+        {'newsletter_id': newsletter_id, 'subscription_id': subscription_id,
+         'email': email, 'status': 'sending', 'sent_at': datetime.utcnow()}
+        for subscription_id, email, _ in recipients
+    ])
+
+
+def _record(newsletter_id, results):
+    deliveries = NewsletterDelivery.__table__
+    db.session.execute(
+        deliveries.update()
+        .where(deliveries.c.newsletter_id == newsletter_id,
+               deliveries.c.subscription_id == bindparam('claimed_id'))
+        .values(status=bindparam('result_status'), error=bindparam('result_error'),
+                sent_at=bindparam('result_sent_at')),
+        results
+    )
+
+
+def _send_claimed(newsletter_id, subject, recipients, html_template, text_template, limiter, connection):
+    results = []
+    for subscription_id, email, username in recipients:
+        limiter.wait()
+        result = {'claimed_id': subscription_id, 'result_status': 'sent',
+                  'result_error': None, 'result_sent_at': None}
+        try:
+            if connection is None:
+                logger.info(f"Newsletter {newsletter_id} to {email}: {subject}")
+            else:
+                connection.send(Message(
+                    subject=subject,
+                    recipients=[email],
+                    html=html_template.safe_substitute(name=escape(username)),
+                    body=text_template.safe_substitute(name=username)
+                ))
+        except Exception as e:
+            result['result_status'] = 'failed'
+            result['result_error'] = str(e)[:2000]
+            logger.warning(f"Newsletter {newsletter_id} to {email} failed: {e}")
+        result['result_sent_at'] = datetime.utcnow()
+        results.append(result)
+    return results
+
+
+def _send_chunk(newsletter_id, subject, recipients, html_template, text_template, limiter, connection, lease):
+    """Send one chunk ``CLAIM_SIZE`` recipients at a time: claim them with
+    ``sending`` rows, commit, send, then record the outcome. Returns the
+    renewed lease, or None once it has been lost."""
+    lease_seconds = current_app.config['NEWSLETTER_LEASE_SECONDS']
+    for start in range(0, len(recipients), CLAIM_SIZE):
+        claimed = recipients[start:start + CLAIM_SIZE]
+        lease = _renew(newsletter_id, lease, lease_seconds)
+        if lease is None:
+            db.session.rollback()
+            return None
+        _claim(newsletter_id, claimed)
+        db.session.commit()
+
+        results = _send_claimed(newsletter_id, subject, claimed, html_template, text_template, limiter, connection)
+        sent = sum(1 for r in results if r['result_status'] == 'sent')
+        lease = _renew(newsletter_id, lease, lease_seconds, sent=sent, failed=len(results) - sent)
+        if lease is None:
+            # The new owner has already marked these as interrupted
+            db.session.rollback()
+            return None
+        _record(newsletter_id, results)
+        db.session.commit()
+    return lease
+
+
+def send_newsletter(newsletter, batch_size=None, max_per_second=None):
+    """Deliver a queued (or interrupted) newsletter to every active subscriber.
+
+    Returns the newsletter, or None if another runner holds it or takes it
+    over mid-send (after ``NEWSLETTER_LEASE_SECONDS`` without progress).
+    """
+    config = current_app.config
+    batch_size = batch_size or config['NEWSLETTER_BATCH_SIZE']
+    if max_per_second is None:
+        max_per_second = config['NEWSLETTER_MAX_PER_SECOND']
+
+    newsletter_id = newsletter.id
+    lease = _acquire(newsletter_id, config['NEWSLETTER_LEASE_SECONDS'])
+    if lease is None:
+        logger.info(f"Newsletter {newsletter_id} is being sent by another runner")
+        return None
+    _fail_interrupted(newsletter_id)
+
+    subject = newsletter.subject
+    html_template, text_template = render_newsletter(newsletter)
+    limiter = RateLimiter(max_per_second)
+    after_id = 0
+
+    while True:
+        recipients = pending_recipients(newsletter_id, after_id, batch_size)
+        if not recipients:
+            break
+        after_id = recipients[-1][0]
+
+        args = (newsletter_id, subject, recipients, html_template, text_template, limiter)
+        if mail_configured():
+            with get_mail().connect() as connection:
+                lease = _send_chunk(*args, connection, lease)
+        else:
+            lease = _send_chunk(*args, None, lease)
+        if lease is None:
+            logger.warning(f"Newsletter {newsletter_id}: lease lost to another runner, stopping")
+            return None
+        db.session.refresh(newsletter)
+        logger.info(f"Newsletter {newsletter_id}: {newsletter.sent_count} sent, {newsletter.failed_count} failed")
+
+    newsletters = Newsletter.__table__
+    db.session.execute(
+        newsletters.update()
+        .where(newsletters.c.id == newsletter_id, newsletters.c.lease_expires_at == lease)
+        .values(status='sent', completed_at=datetime.utcnow(), lease_expires_at=None)
+    )
+    db.session.commit()
+    return newsletter
+
+
+def retry_failed(newsletter):
+    """Forget failed deliveries so the next run sends to those recipients again."""
+    count = newsletter.deliveries.filter_by(status='failed').delete(synchronize_session=False)
+    newsletter.failed_count = 0
+    if count and newsletter.status == 'sent':
+        newsletter.status = 'queued'
+    db.session.commit()
+    return count
+
+
+def send_pending_newsletters(**kwargs):
+    """Send every queued newsletter and resume interrupted ones whose lease
+    has expired. Returns how many this runner sent."""
+    now = datetime.utcnow()
+    newsletters = Newsletter.query.filter(or_(
+        Newsletter.status == 'queued',
+        and_(Newsletter.status == 'sending',
+             or_(Newsletter.lease_expires_at.is_(None), Newsletter.lease_expires_at < now)),
+    )).order_by(Newsletter.id).all()
+    return sum(1 for newsletter in newsletters if send_newsletter(newsletter, **kwargs) is not None)
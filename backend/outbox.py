@@ -0,0 +1,142 @@
+"""
+Email outbox worker for Kizuna Platform
+
+Drains ``EmailOutbox`` in batches over a single SMTP connection per batch,
+retrying failures with exponential backoff and dead-lettering rows that
+exhaust ``OUTBOX_MAX_ATTEMPTS``. Run with ``flask kizuna outbox``.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import db, EmailOutbox
+from .mail import get_mail, mail_configured, build_message
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 3600  # seconds
+
+
+def _claim_batch(batch_size):
+    """Lock a batch of due rows. SKIP LOCKED lets several workers share the queue
+    on PostgreSQL; SQLite ignores it and serializes writers instead."""
+    return (
+        EmailOutbox.query
+        .filter(EmailOutbox.status == 'pending',
+                EmailOutbox.next_attempt_at <= datetime.utcnow())
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def _mark_failed(row, error):
+    config = current_app.config
+    row.attempts += 1
+    row.last_error = str(error)[:2000]
+    if row.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+        row.status = 'dead'
+        logger.error(f"Outbox email {row.id} to {row.recipient} dead-lettered after {row.attempts} attempts: {error}")
+    else:
+        delay = min(config['OUTBOX_RETRY_BASE_SECONDS'] * 2 ** (row.attempts - 1), MAX_RETRY_DELAY)
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logger.warning(f"Outbox email {row.id} to {row.recipient} failed (attempt {row.attempts}), retrying in {delay}s: {error}")
+
+
+def _mark_sent(row):
+    row.status = 'sent'
+    row.sent_at = datetime.utcnow()
+
+
+def _deliver(rows, connection):
+    for row in rows:
+        try:
+            msg = build_message(row)
+            if msg is None:
+                row.status = 'dead'
+                row.last_error = 'Nothing to send (source record no longer exists)'
+                continue
+            if connection is None:
+                logger.info(f"Email ({row.kind}) to {row.recipient}: {msg.subject}")
+            else:
+                connection.send(msg)
+            _mark_sent(row)
+        except Exception as e:
+            _mark_failed(row, e)
+
+
+def drain_batch(batch_size=None):
+    """Deliver one batch of due outbox emails. Returns the number of rows processed."""
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    rows = _claim_batch(batch_size)
+    if not rows:
+        db.session.commit()
+        return 0
+
+    if not mail_configured():
+        _deliver(rows, None)
+    else:
+        try:
+            with get_mail().connect() as connection:
+                _deliver(rows, connection)
+        except Exception as e:
+            # Connecting/authenticating failed: nothing in the batch was sent
+            for row in rows:
+                if row.status == 'pending':
+                    _mark_failed(row, e)
+
+    db.session.commit()
+    sent = sum(1 for row in rows if row.status == 'sent')
+    logger.info(f"Outbox batch: {sent}/{len(rows)} sent")
+    return len(rows)
+
+
+def drain_outbox(batch_size=None):
+    """Deliver every currently due outbox email. Returns the number of rows processed."""
+    total = 0
+    while True:
+        processed = drain_batch(batch_size)
+        total += processed
+        if not processed:
+            return total
+
+
+def requeue_dead():
+    """Move dead-lettered emails back to the queue. Returns the number requeued."""
+    count = EmailOutbox.query.filter_by(status='dead').update(
+        {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+
+def run_worker(app, workers=1, batch_size=None, poll_interval=None, stop_event=None):
+    """Drain the outbox continuously with a pool of worker threads until stopped."""
+    stop_event = stop_event or threading.Event()
+    poll_interval = poll_interval or app.config['OUTBOX_POLL_INTERVAL']
+
+    def loop():
+        while not stop_event.is_set():
+            with app.app_context():
+                try:
+                    processed = drain_batch(batch_size)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Outbox worker error: {e}")
+                    processed = 0
+            if not processed:
+                stop_event.wait(poll_interval)
+
+    threads = [threading.Thread(target=loop, name=f'outbox-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,188 @@
+"""
+Keyset (cursor) pagination
+
+``paginate_keyset`` pages through a query ordered by a list of columns
+ending in a unique one, e.g. ``(Event.event_date, Event.id)``. Instead of
+``OFFSET`` it seeks past the last row shown (``WHERE (event_date, id) <
+(:date, :id)``), so with an index on those columns every page costs the
+same as the first, however deep the archive goes. Pages link to each
+other with opaque ``next_cursor``/``prev_cursor`` tokens (the key values
+as base64url JSON); a cursor that cannot be read shows the first page.
+
+Totals are optional (``count``):
+
+- ``None``: no count query at all;
+- ``'exact'``: ``COUNT(*)`` over the filtered query;
+- ``'estimate'``: the PostgreSQL planner's row estimate (an ``EXPLAIN``,
+  no scan), counted exactly when it is small or on other databases.
+  ``Page.total_is_estimate`` tells templates to say "about".
+
+Relevance-ranked search results have no stable key to seek on, so they use
+``paginate_offset``, which returns the same ``Page`` with offset cursors.
+"""
+import base64
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from sqlalchemy import func, select, tuple_
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ('exact', 'estimate')
+EXACT_COUNT_BELOW = 1000  # estimates under this are replaced by a real count
+
+
+@dataclass
+class Page:
+    items: list = field(default_factory=list)
+    next_cursor: str = None
+    prev_cursor: str = None
+    total: int = None
+    total_is_estimate: bool = False
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':'), default=_json_value).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """The cursor's data, or None if there is none or it cannot be read."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def _key_values(data, columns):
+    """The cursor's key values converted to the columns' Python types."""
+    values = data.get('k')
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+    converted = []
+    try:
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                converted.append(datetime.fromisoformat(value))
+            elif python_type is date:
+                converted.append(date.fromisoformat(value))
+            elif isinstance(value, python_type) and not isinstance(value, bool):
+                converted.append(value)
+            else:
+                return None
+    except (TypeError, ValueError, NotImplementedError):
+        return None
+    return converted
+
+
+def count_rows(query, mode):
+    """(total, is_estimate) for ``query`` under the ``count`` mode."""
+    if mode not in COUNT_MODES:
+        return None, False
+    query = query.order_by(None)
+    if mode == 'estimate' and db.engine.dialect.name == 'postgresql':
+        estimate = _planner_estimate(query)
+        if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+            return estimate, True
+    total = db.session.execute(select(func.count()).select_from(query.subquery())).scalar()
+    return total, False
+
+
+def _planner_estimate(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect,
+                                       compile_kwargs={'render_postcompile': True})
+    try:
+        plan = db.session.connection().exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except Exception as e:
+        logger.warning(f"Row estimate failed, counting instead: {e}")
+        return None
+
+
+def paginate_keyset(query, order, per_page, cursor=None, descending=False, count=None, where=()):
+    """One page of ``query`` ordered by the ``order`` columns (the last one
+    unique), all ascending or all ``descending``. ``query`` must not be
+    ordered already.
+
+    Conditions on the order columns themselves (``Event.event_date <
+    today``) go in ``where`` rather than on ``query``: they are added after
+    the cursor's, and SQLite seeks on the first bound it finds on a column.
+    """
+    columns = list(order)
+    data = decode_cursor(cursor)
+    values = _key_values(data, columns) if data is not None else None
+    backwards = values is not None and data.get('d') == 'prev'
+
+    # Walking back from the first row shown scans in the opposite order
+    reverse = descending != backwards
+    page_query = query.order_by(*(column.desc() if reverse else column.asc() for column in columns))
+    if values is not None:
+        key = tuple_(*columns)
+        page_query = page_query.filter(key < tuple_(*values) if reverse else key > tuple_(*values))
+    rows = page_query.filter(*where).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        if not more:
+            # Back at the start: show a full first page rather than a partial one
+            return paginate_keyset(query, order, per_page, descending=descending, count=count, where=where)
+        rows.reverse()
+        has_prev, has_next = True, True
+    else:
+        has_prev, has_next = values is not None, more
+
+    def cursor_for(row, direction):
+        return encode_cursor({'k': [getattr(row, column.key) for column in columns], 'd': direction})
+
+    total, is_estimate = count_rows(query.filter(*where), count)
+    return Page(
+        items=rows,
+        next_cursor=cursor_for(rows[-1], 'next') if rows and has_next else None,
+        prev_cursor=cursor_for(rows[0], 'prev') if rows and has_prev else None,
+        total=total,
+        total_is_estimate=is_estimate,
+    )
+
+
+def paginate_offset(query, per_page, cursor=None, count=None):
+    """Like ``paginate_keyset`` for an already-ordered query, using offsets."""
+    data = decode_cursor(cursor)
+    offset = data.get('o') if data is not None else 0
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        offset = 0
+    rows = query.offset(offset).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    total, is_estimate = count_rows(query, count)
+    return Page(
+        items=rows[:per_page],
+        next_cursor=encode_cursor({'o': offset + per_page}) if more else None,
+        prev_cursor=encode_cursor({'o': max(offset - per_page, 0)}) if offset else None,
+        total=total,
+        total_is_estimate=is_estimate,
+    )
@@ -0,0 +1,137 @@
+"""
+SQL query profiler for Kizuna Platform
+
+Counts the queries each request issues, how long they take, and how often
+each statement repeats. A statement repeating more than
+``SQL_REPEAT_THRESHOLD`` times in one request is nearly always an N+1
+(a query per row from a loop or a template), so with ``SQL_PROFILER``:
+
+- ``warn`` (development): log a warning when the request ends;
+- ``raise`` (testing): raise ``RepeatedQueryError`` from the query that
+  crossed the threshold, so the traceback points at the loop;
+- ``off`` (production): no per-request profiling.
+
+Timings come from the request metrics' query timer (``backend/metrics.py``),
+which passes each statement to the active query logs, so queries are
+timed once whichever of the two is on.
+
+``profile_queries()`` and ``assert_max_queries(n)`` work outside requests
+too, e.g. to lock in a route's query budget::
+
+    with assert_max_queries(3):
+        client.get('/clubs/')
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, request
+from .metrics import add_query_observer, remove_query_observer
+
+logger = logging.getLogger(__name__)
+
+
+class RepeatedQueryError(Exception):
+    """Raised when one statement runs more than the allowed number of times."""
+
+    def __init__(self, statement, count):
+        super().__init__(f'Statement ran {count} times in one request (likely N+1): {statement}')
+        self.statement = statement
+        self.count = count
+
+
+class QueryLog:
+    """Queries seen while this log is active."""
+
+    def __init__(self, repeat_threshold=None):
+        self.repeat_threshold = repeat_threshold
+        self.statements = Counter()  # statement -> times run
+        self.seconds = Counter()  # statement -> total time
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def record(self, statement, seconds):
+        self.statements[statement] += 1
+        self.seconds[statement] += seconds
+        self.count += 1
+        self.total_seconds += seconds
+
+    def observe(self, statement, seconds):
+        """Query observer for ``metrics.add_query_observer``."""
+        statement = _normalize(statement)
+        self.record(statement, seconds)
+        if self.repeat_threshold is not None and self.statements[statement] == self.repeat_threshold + 1:
+            raise RepeatedQueryError(statement, self.statements[statement])
+
+    def repeated(self, threshold=None):
+        """(statement, count) pairs that ran more than ``threshold`` times."""
+        threshold = threshold if threshold is not None else self.repeat_threshold
+        if threshold is None:
+            return []
+        return [(s, n) for s, n in self.statements.most_common() if n > threshold]
+
+    def report(self, limit=10):
+        lines = [f'{self.count} queries in {self.total_seconds * 1000:.1f} ms']
+        for statement, n in self.statements.most_common(limit):
+            lines.append(f'  {n:>4}x {self.seconds[statement] * 1000:8.1f} ms  {_shorten(statement)}')
+        return '\n'.join(lines)
+
+
+def _normalize(statement):
+    return re.sub(r'\s+', ' ', statement).strip()
+
+
+def _shorten(statement, width=160):
+    return statement if len(statement) <= width else statement[:width - 3] + '...'
+
+
+@contextmanager
+def profile_queries(repeat_threshold=None):
+    """Collect the queries run inside the block into a ``QueryLog``.
+
+    With ``repeat_threshold``, a statement running more often than that
+    raises ``RepeatedQueryError``.
+    """
+    log = QueryLog(repeat_threshold)
+    token = add_query_observer(log.observe)
+    try:
+        yield log
+    finally:
+        remove_query_observer(token)
+
+
+@contextmanager
+def assert_max_queries(n):
+    """Fail with the query report if the block runs more than ``n`` queries."""
+    with profile_queries() as log:
+        yield log
+    if log.count > n:
+        raise AssertionError(f'Expected at most {n} queries, got {log.report()}')
+
+
+def _start_request():
+    mode = current_app.config['SQL_PROFILER']
+    threshold = current_app.config.get('SQL_REPEAT_THRESHOLD', 5)
+    g.query_log = QueryLog(threshold if mode == 'raise' else None)
+    g.query_log_token = add_query_observer(g.query_log.observe)
+
+
+def _finish_request(exception):
+    token = g.pop('query_log_token', None)
+    if token is None:
+        return
+    remove_query_observer(token)
+    log = g.pop('query_log')
+    repeated = log.repeated(current_app.config.get('SQL_REPEAT_THRESHOLD', 5))
+    if repeated:
+        details = '; '.join(f'{n}x {_shorten(statement)}' for statement, n in repeated)
+        logger.warning(f"Repeated queries (likely N+1) in {request.method} {request.path} "
+                       f"[{request.endpoint}]: {details}")
+
+
+def init_profiler(app):
+    """Profile every request's queries when ``SQL_PROFILER`` is warn or raise."""
+    if app.config.get('SQL_PROFILER', 'off') not in ('warn', 'raise'):
+        return
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
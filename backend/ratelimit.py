@@ -0,0 +1,227 @@
+"""
+Rate limiting for Kizuna Platform
+
+Limits are sliding-window counters: each (key, window) keeps only the
+current and previous fixed-window counts, and the previous count is
+weighted by how much of it still overlaps the sliding window. Memory per
+key is constant no matter how many requests it makes.
+
+Backends (``RATE_LIMIT_BACKEND``):
+
+- ``memory``: per-process LRU, bounded by ``RATE_LIMIT_MAX_KEYS``; keys
+  whose windows have passed are evicted as new keys arrive.
+- ``sql``: the ``rate_limits`` table, so every worker and serverless
+  instance enforces the same limit.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from .models import db, RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+LIMIT_SETTINGS = {'RATE_LIMIT_PER_MINUTE': 60, 'RATE_LIMIT_PER_HOUR': 3600}  # setting -> window seconds
+
+
+def slide(state, now, window):
+    """Roll a ``(window_id, count, previous)`` state forward to ``now``."""
+    window_id = int(now // window)
+    if state is None or state[0] < window_id - 1:
+        return window_id, 0, 0
+    if state[0] == window_id - 1:
+        return window_id, 0, state[1]
+    return state
+
+
+def retry_after(state, now, window, limit):
+    """Seconds until one more request fits under ``limit``."""
+    window_id, count, previous = state
+    elapsed = now - window_id * window
+    if count < limit:
+        # Wait for enough of the previous window to slide out
+        wait = window * (1 - (limit - 1 - count) / previous) - elapsed if previous else 0
+    else:
+        # Wait for the next window, then for enough of this one to slide out
+        wait = (window - elapsed) + window * (1 - (limit - 1) / count)
+    return max(1, math.ceil(wait))
+
+
+def apply_limits(states, limits, now):
+    """Check every limit against its state. Returns (allowed, retry_after, new_states);
+    the new states count this request only when it is allowed."""
+    rolled = []
+    wait = 0
+    for state, (limit, window) in zip(states, limits):
+        state = slide(state, now, window)
+        window_id, count, previous = state
+        # Sliding-window estimate: the part of the previous window still in range, plus this one
+        if previous * (1 - (now - window_id * window) / window) + count + 1 > limit:
+            wait = max(wait, retry_after(state, now, window, limit))
+        rolled.append(state)
+    if wait:
+        return False, wait, rolled
+    return True, 0, [(window_id, count + 1, previous) for window_id, count, previous in rolled]
+
+
+class MemoryRateLimitBackend:
+    """Per-process counters in an LRU of at most ``max_keys`` (key, window) entries."""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._states = OrderedDict()  # (key, window) -> (window_id, count, previous)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Least recently used first, and past the bound any state two windows
+        # old (it counts nothing), so a burst of stale keys is dropped together
+        states = self._states
+        while states:
+            (_, window), (window_id, _, _) = next(iter(states.items()))
+            if len(states) <= self.max_keys and (window_id + 2) * window > now:
+                break
+            states.popitem(last=False)
+
+    def hit(self, key, limits, now=None):
+        # apply_limits() inlined: this runs on every rate-limited request
+        now = time.time() if now is None else now
+        states = self._states
+        with self._lock:
+            rolled = []
+            wait = 0
+            for limit, window in limits:
+                slot = (key, window)
+                window_id = int(now // window)
+                state = states.get(slot)
+                if state is None or state[0] < window_id - 1:
+                    count = previous = 0
+                elif state[0] == window_id - 1:
+                    count, previous = 0, state[1]
+                else:
+                    _, count, previous = state
+                if previous * (1 - (now - window_id * window) / window) + count + 1 > limit:
+                    wait = max(wait, retry_after((window_id, count, previous), now, window, limit))
+                rolled.append((slot, window_id, count, previous))
+            added = 0 if wait else 1
+            for slot, window_id, count, previous in rolled:
+                states[slot] = (window_id, count + added, previous)
+                states.move_to_end(slot)
+            if len(states) > self.max_keys:
+                self._evict(now)
+        return not wait, wait
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                for slot in [slot for slot in self._states if slot[0] == key]:
+                    del self._states[slot]
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SQLRateLimitBackend:
+    """Counters in the ``rate_limits`` table, shared by every process."""
+
+    name = 'sql'
+    PURGE_EVERY = 500  # hits between purges of expired rows
+
+    def __init__(self):
+        self.table = RateLimitCounter.__table__
+        self._hits = 0
+
+    def _hit(self, conn, key, limits, now):
+        table = self.table
+        slots = [f'{key}|{window}' for _, window in limits]
+        rows = {
+            row.key: (row.window_id, row.count, row.previous)
+            for row in conn.execute(
+                select(table).where(table.c.key.in_(slots)).with_for_update()
+            )
+        }
+        allowed, wait, new_states = apply_limits([rows.get(slot) for slot in slots], limits, now)
+        for slot, (_, window), (window_id, count, previous) in zip(slots, limits, new_states):
+            values = dict(window_id=window_id, count=count, previous=previous,
+                          expires_at=datetime.utcfromtimestamp((window_id + 2) * window))
+            if slot in rows:
+                conn.execute(table.update().where(table.c.key == slot).values(**values))
+            else:
+                conn.execute(table.insert().values(key=slot, **values))
+        return allowed, wait
+
+    def hit(self, key, limits, now=None):
+        now = time.time() if now is None else now
+        try:
+            with db.engine.begin() as conn:
+                result = self._hit(conn, key, limits, now)
+        except IntegrityError:
+            # Another worker inserted the first row for this key; its row is locked now
+            with db.engine.begin() as conn:
+                result = self._hit(conn, key, limits, now)
+        self._hits += 1
+        if self._hits % self.PURGE_EVERY == 0:
+            self.purge()
+        return result
+
+    def purge(self):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.expires_at < datetime.utcnow()))
+
+    def reset(self, key=None):
+        with db.engine.begin() as conn:
+            stmt = self.table.delete()
+            if key is not None:
+                stmt = stmt.where(self.table.c.key.startswith(f'{key}|', autoescape=True))
+            conn.execute(stmt)
+
+
+def init_rate_limiter(app):
+    """Create the configured rate limit backend."""
+    for name in LIMIT_SETTINGS:
+        if app.config.get(name, 0) < 0:
+            raise ValueError(f'{name} must be 0 (no limit) or a positive number of requests')
+    if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'sql':
+        backend = SQLRateLimitBackend()
+    else:
+        backend = MemoryRateLimitBackend(app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+    app.extensions['kizuna_rate_limiter'] = backend
+
+
+def get_rate_limiter():
+    return current_app.extensions['kizuna_rate_limiter']
+
+
+def hit(key, limits):
+    """Count one request for ``key`` against every ``(limit, window_seconds)`` in ``limits``.
+
+    Returns (allowed, retry_after_seconds). A denied request is not counted.
+    Always allowed when ``RATE_LIMIT_ENABLED`` is off.
+    """
+    if not current_app.config.get('RATE_LIMIT_ENABLED', True) or not limits:
+        return True, 0
+    try:
+        return get_rate_limiter().hit(key, limits)
+    except Exception as e:
+        # Never lock everyone out because the limiter's store is unavailable
+        logger.error(f"Rate limiter failed for {key}: {e}")
+        return True, 0
+
+
+def configured_limits():
+    """The per-minute and per-hour limits from ``RATE_LIMIT_PER_MINUTE``/``RATE_LIMIT_PER_HOUR``.
+
+    A limit of 0 turns that window off; it is left out rather than passed
+    on, since a zero limit would deny everything (and ``retry_after``
+    cannot compute a wait for it).
+    """
+    config = current_app.config
+    return [(config[name], window) for name, window in LIMIT_SETTINGS.items() if config[name] > 0]
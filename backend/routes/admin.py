@@ -1,10 +1,18 @@
 import logging
 from functools import wraps
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import login_required, current_user
-from ..models import db, Event, EventRegistration, Club
+from ..models import db, Event, EventRegistration, Club, Newsletter, NewsletterSubscription
 from datetime import datetime
 from time import time
+from ..analytics import dashboard_stats, delete_event_rollups, recompute_rollups
+from ..cache import get_page_cache
+from ..compression import compressed_cache_stats
+from ..dbpool import pool_stats
+from ..metrics import collect, summary
+from ..export import EXPORT_FORMATS, STATUSES, participant_batches
+from ..importer import KINDS, ImportFormatError, format_for, import_rows, read_rows
+from ..pagination import paginate_keyset
 from ..utils import (
     sanitize_input, validate_title, validate_description,
     validate_cas_type, validate_integer, validate_url
@@ -27,20 +35,26 @@ def admin_required(f):
 @login_required
 @admin_required
 def dashboard():
-    total_events = Event.query.count()
-    total_registrations = EventRegistration.query.count()
+    stats = dashboard_stats()
     
-    logger.debug(f"Admin dashboard accessed by: {current_user.username}")
+    logger.debug("Admin dashboard accessed by: %s", current_user.username)
 
-    return render_template('admin/dashboard.html',
-                         total_events=total_events,
-                         total_registrations=total_registrations)
+    return render_template('admin/dashboard.html', stats=stats)
+
+@admin_bp.route('/analytics/recompute', methods=['POST'])
+@login_required
+@admin_required
+def recompute_analytics():
+    written = recompute_rollups()
+    logger.info(f"Registration rollups recomputed by admin: {current_user.username}")
+    flash(f'Analytics recomputed ({written} rollup rows)', 'success')
+    return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/events')
 @login_required
 @admin_required
 def manage_events():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '').strip()
     cas_type = request.args.get('cas_type', '').strip()
     status = request.args.get('status', '').strip()
@@ -58,7 +72,8 @@ def manage_events():
     elif status == 'draft':
         query = query.filter(Event.is_published.is_(False))
     
-    events = query.order_by(Event.event_date.desc()).paginate(page=page, per_page=20)
+    events = paginate_keyset(query, (Event.event_date, Event.id), 20, cursor, descending=True,
+                             count=current_app.config['PAGINATION_COUNT'])
     
     return render_template('admin/events.html', events=events, search=search, cas_type=cas_type, status=status)
 
@@ -73,6 +88,8 @@ def bulk_delete_events():
         return redirect(url_for('admin.manage_events'))
     
     deleted_count = Event.query.filter(Event.id.in_(event_ids)).delete(synchronize_session='fetch')
+    # Query.delete skips the mapper events that clear the dashboard rollups
+    delete_event_rollups(db.session.connection(), event_ids)
     db.session.commit()
     
     logger.info(f"Bulk deleted {deleted_count} events by admin: {current_user.username}")
@@ -282,8 +299,8 @@ def delete_event(event_id):
 @login_required
 @admin_required
 def manage_clubs():
-    page = request.args.get('page', 1, type=int)
-    clubs = Club.query.order_by(Club.name).paginate(page=page, per_page=20)
+    clubs = paginate_keyset(Club.query, (Club.name, Club.id), 20, request.args.get('cursor'),
+                            count=current_app.config['PAGINATION_COUNT'])
     return render_template('admin/clubs.html', clubs=clubs)
 
 @admin_bp.route('/clubs/create', methods=['GET', 'POST'])
@@ -426,3 +443,169 @@ def print_event_participants(event_id):
     registrations = EventRegistration.query.filter_by(event_id=event_id).order_by(EventRegistration.registered_at).all()
     return render_template('admin/print_participants.html', event=event, registrations=registrations)
 
+
+@admin_bp.route('/events/<int:event_id>/participants/export')
+@login_required
+@admin_required
+def export_participants(event_id):
+    """Stream the participant list as CSV or XLSX, optionally for one status."""
+    event = Event.query.get_or_404(event_id)
+    fmt = request.args.get('format', 'csv')
+    status = request.args.get('status') or None
+    if fmt not in EXPORT_FORMATS or (status and status not in STATUSES):
+        flash('Unknown export format or status', 'error')
+        return redirect(url_for('admin.event_participants', event_id=event_id))
+
+    writer, mimetype = EXPORT_FORMATS[fmt]
+    filename = f'event-{event.id}-participants{"-" + status if status else ""}.{fmt}'
+    logger.info(f"Participants of event {event.id} exported as {fmt} by admin: {current_user.username}")
+    # stream_with_context keeps the request (and its DB session) open while the body streams
+    response = Response(stream_with_context(writer(participant_batches(event.id, status))), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# Newsletter
+@admin_bp.route('/newsletters', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def manage_newsletters():
+    if request.method == 'POST':
+        errors = []
+        subject = request.form.get('subject', '')
+        body = request.form.get('body', '')
+
+        # Newsletters are rendered through autoescaped email templates, so the
+        # validators are used for their checks and the raw text is stored.
+        valid, message = validate_title(subject)
+        if not valid:
+            errors.append(message)
+        valid, message = validate_description(body, max_length=20000)
+        if not valid:
+            errors.append(message)
+        elif not body.strip():
+            errors.append('Newsletter body is required')
+
+        if errors:
+            for error in errors:
+                flash(error, 'error')
+        else:
+            newsletter = Newsletter(subject=subject.strip(), body=body.strip())
+            db.session.add(newsletter)
+            db.session.commit()
+            logger.info(f"Newsletter drafted: '{newsletter.subject}' (ID: {newsletter.id}) by admin: {current_user.username}")
+            flash('Newsletter saved as draft', 'success')
+            return redirect(url_for('admin.manage_newsletters'))
+
+    page = request.args.get('page', 1, type=int)
+    newsletters = Newsletter.query.order_by(Newsletter.created_at.desc()).paginate(page=page, per_page=20)
+    subscriber_count = NewsletterSubscription.query.filter_by(is_active=True).count()
+    return render_template('admin/newsletters.html', newsletters=newsletters, subscriber_count=subscriber_count)
+
+@admin_bp.route('/newsletters/<int:newsletter_id>/send', methods=['POST'])
+@login_required
+@admin_required
+def send_newsletter(newsletter_id):
+    newsletter = Newsletter.query.get_or_404(newsletter_id)
+
+    if newsletter.status != 'draft':
+        flash('This newsletter has already been sent or queued', 'warning')
+        return redirect(url_for('admin.manage_newsletters'))
+
+    # Delivery happens in the newsletter worker (flask kizuna newsletter)
+    newsletter.status = 'queued'
+    db.session.commit()
+    logger.info(f"Newsletter queued: '{newsletter.subject}' (ID: {newsletter.id}) by admin: {current_user.username}")
+    flash('Newsletter queued for sending', 'success')
+    return redirect(url_for('admin.manage_newsletters'))
+
+@admin_bp.route('/newsletters/<int:newsletter_id>/delete', methods=['POST'])
+@login_required
+@admin_required
+def delete_newsletter(newsletter_id):
+    newsletter = Newsletter.query.get_or_404(newsletter_id)
+
+    if newsletter.status != 'draft':
+        flash('Only drafts can be deleted', 'error')
+        return redirect(url_for('admin.manage_newsletters'))
+
+    db.session.delete(newsletter)
+    db.session.commit()
+    logger.info(f"Newsletter deleted: '{newsletter.subject}' (ID: {newsletter_id}) by admin: {current_user.username}")
+    flash('Newsletter deleted', 'success')
+    return redirect(url_for('admin.manage_newsletters'))
+
+MAX_IMPORT_ERRORS_SHOWN = 200
+
+@admin_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_data():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        dry_run = request.form.get('dry_run') == 'on'
+        skip_invalid = request.form.get('skip_invalid') == 'on'
+
+        if kind not in KINDS:
+            flash('Choose what to import', 'error')
+            return render_template('admin/import.html', kinds=KINDS)
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSON file', 'error')
+            return render_template('admin/import.html', kinds=KINDS)
+
+        try:
+            data = upload.read().decode('utf-8-sig')
+            rows = read_rows(data, format_for(upload.filename))
+            result = import_rows(kind, rows, dry_run=dry_run, skip_invalid=skip_invalid)
+        except UnicodeDecodeError:
+            flash('The file must be UTF-8 encoded', 'error')
+            return render_template('admin/import.html', kinds=KINDS)
+        except ImportFormatError as e:
+            flash(str(e), 'error')
+            return render_template('admin/import.html', kinds=KINDS)
+
+        if result.created:
+            logger.info(f"Imported {result.created} {kind} from '{upload.filename}' by admin: {current_user.username}")
+            flash(f'Imported {result.created} {kind}', 'success')
+        elif dry_run:
+            flash(f'Dry run: {result.valid} of {result.total} rows are valid', 'info')
+        elif result.errors:
+            flash(f'Nothing imported: {len(result.errors)} row(s) have errors', 'error')
+        return render_template('admin/import.html', kinds=KINDS, result=result,
+                               errors=result.errors[:MAX_IMPORT_ERRORS_SHOWN])
+
+    return render_template('admin/import.html', kinds=KINDS)
+
+@admin_bp.route('/cache')
+@login_required
+@admin_required
+def cache_stats():
+    cache = get_page_cache()
+    stats = cache.stats() if cache is not None else {'backend': 'none'}
+    stats['compressed_bodies'] = compressed_cache_stats()
+    return jsonify(stats)
+
+@admin_bp.route('/db-pool')
+@login_required
+@admin_required
+def db_pool_stats():
+    return jsonify(mode=current_app.config['DB_POOL_MODE'], **pool_stats(db.engine))
+
+@admin_bp.route('/metrics')
+@login_required
+@admin_required
+def metrics_summary():
+    return jsonify(summary(collect(current_app.config.get('METRICS_DIR'))))
+
+@admin_bp.route('/cache/clear', methods=['POST'])
+@login_required
+@admin_required
+def clear_cache():
+    cache = get_page_cache()
+    if cache is not None:
+        cache.backend.clear()
+    logger.info(f"Page cache cleared by admin: {current_user.username}")
+    flash('Page cache cleared', 'success')
+    return redirect(url_for('admin.dashboard'))
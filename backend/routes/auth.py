@@ -3,7 +3,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from ..models import db, User
 from datetime import datetime, timedelta
-from ..utils import check_rate_limit, get_client_ip
+from ..utils import get_client_ip
+from ..ratelimit import configured_limits, hit
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 logger = logging.getLogger(__name__)
@@ -14,13 +15,14 @@ def login():
         return redirect(url_for('main.index'))
     
     ip = get_client_ip()
-    allowed, remaining = check_rate_limit(f'login:{ip}', max_requests=10, window_seconds=300)
-    if not allowed:
-        logger.warning(f"Login rate limited for IP: {ip}")
-        flash(f'Too many login attempts. Please try again in {remaining} seconds.', 'error')
-        return render_template('auth/login.html')
 
     if request.method == 'POST':
+        allowed, remaining = hit(f'login:{ip}', configured_limits())
+        if not allowed:
+            logger.warning(f"Login rate limited for IP: {ip}")
+            flash(f'Too many login attempts. Please try again in {remaining} seconds.', 'error')
+            return render_template('auth/login.html'), 429
+
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
         remember = request.form.get('remember') == 'on'
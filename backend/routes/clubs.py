@@ -1,47 +1,113 @@
 import logging
 from datetime import datetime
-from flask import Blueprint, render_template, request
-from ..models import Club, Event
-from sqlalchemy import or_, func
+from flask import Blueprint, current_app, render_template, request
+from ..models import db, Club, Event
+from sqlalchemy import case, func
+from ..search import apply_search
+from ..cache import cached_page
 
 clubs_bp = Blueprint('clubs', __name__, url_prefix='/clubs')
 logger = logging.getLogger(__name__)
 
 DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
+SORTS = {
+    'upcoming': 'Most upcoming events',
+    'events': 'Most events',
+    'name': 'Name',
+}
+
+def event_counts_subquery(now):
+    """Published event counts per club, split into upcoming and past, as one grouped aggregate."""
+    is_upcoming = Event.event_date >= now
+    return (db.session.query(
+                Event.club_id.label('club_id'),
+                func.sum(case((is_upcoming, 1), else_=0)).label('upcoming'),
+                func.sum(case((is_upcoming, 0), else_=1)).label('past'))
+            .filter(Event.club_id.isnot(None), Event.is_published == True)
+            .group_by(Event.club_id)
+            .subquery())
+
 @clubs_bp.route('/')
+@cached_page('clubs', 'events')
 def index():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('q', '').strip()
     day = request.args.get('day', '').strip()
-    
-    query = Club.query.filter_by(is_active=True)
+    sort = request.args.get('sort', '').strip()
+    activity = request.args.get('activity', '').strip()
+
+    counts = event_counts_subquery(datetime.utcnow())
+    upcoming_count = func.coalesce(counts.c.upcoming, 0)
+    past_count = func.coalesce(counts.c.past, 0)
+
+    query = (db.session.query(Club, upcoming_count.label('upcoming'), past_count.label('past'))
+             .outerjoin(counts, counts.c.club_id == Club.id)
+             .filter(Club.is_active == True))
     
     if day and day in DAYS:
         query = query.filter(Club.meeting_day == day)
+
+    if activity == 'upcoming':
+        query = query.filter(upcoming_count > 0)
+    elif activity == 'none':
+        query = query.filter(upcoming_count == 0)
     
-    if search:
-        search_filter = or_(
-            Club.name.ilike(f'%{search}%'),
-            Club.description.ilike(f'%{search}%'),
-            Club.leader_name.ilike(f'%{search}%'),
-            Club.meeting_location.ilike(f'%{search}%')
-        )
-        query = query.filter(search_filter)
-    
-    clubs = query.paginate(page=page, per_page=12)
+    if sort == 'upcoming':
+        query = query.order_by(upcoming_count.desc())
+    elif sort == 'events':
+        query = query.order_by((upcoming_count + past_count).desc())
+    elif sort == 'name':
+        query = query.order_by(Club.name)
     
-    event_counts = {}
-    for club in clubs.items:
-        event_counts[club.id] = Event.query.filter_by(club_id=club.id).count()
+    # Relevance orders within the chosen sort
+    if search:
+        query = apply_search(query, 'clubs', search)
+
+    clubs = query.order_by(Club.id).paginate(page=page, per_page=12)
     
-    return render_template('clubs/index.html', clubs=clubs, search=search, day=day, days=DAYS, event_counts=event_counts)
+    return render_template('clubs/index.html', clubs=clubs, search=search, day=day, days=DAYS,
+                           sort=sort, sorts=SORTS, activity=activity)
+
+PAST_EVENTS_PREVIEW = 5
+
+def club_events_query(club_id):
+    """Published events of a club; ordered ranges use the (club_id, event_date) index."""
+    return Event.query.filter(Event.club_id == club_id, Event.is_published == True)
 
 @clubs_bp.route('/<int:club_id>')
+@cached_page('clubs', 'events')
 def detail(club_id):
     club = Club.query.get_or_404(club_id)
+    page = request.args.get('page', 1, type=int)
     now = datetime.utcnow()
-    upcoming_events = [e for e in club.events if e.event_date >= now] if club.events else []
-    past_events = [e for e in club.events if e.event_date < now] if club.events else []
-    logger.debug(f"Club detail viewed: '{club.name}' (ID: {club_id})")
-    return render_template('clubs/detail.html', club=club, upcoming_events=upcoming_events, past_events=past_events)
+
+    upcoming_events = (club_events_query(club_id)
+                       .filter(Event.event_date >= now)
+                       .order_by(Event.event_date.asc(), Event.id.asc())
+                       .paginate(page=page, per_page=current_app.config['EVENTS_PER_PAGE']))
+
+    # One extra row tells whether the full history has more to show
+    past_events = (club_events_query(club_id)
+                   .filter(Event.event_date < now)
+                   .order_by(Event.event_date.desc(), Event.id.desc())
+                   .limit(PAST_EVENTS_PREVIEW + 1)
+                   .all())
+    more_past_events = len(past_events) > PAST_EVENTS_PREVIEW
+
+    logger.debug("Club detail viewed: '%s' (ID: %s)", club.name, club_id)
+    return render_template('clubs/detail.html', club=club, upcoming_events=upcoming_events,
+                           past_events=past_events[:PAST_EVENTS_PREVIEW], more_past_events=more_past_events)
+
+@clubs_bp.route('/<int:club_id>/past')
+@cached_page('clubs', 'events')
+def past_events(club_id):
+    club = Club.query.get_or_404(club_id)
+    page = request.args.get('page', 1, type=int)
+
+    events = (club_events_query(club_id)
+              .filter(Event.event_date < datetime.utcnow())
+              .order_by(Event.event_date.desc(), Event.id.desc())
+              .paginate(page=page, per_page=current_app.config['EVENTS_PER_PAGE']))
+
+    return render_template('clubs/past_events.html', club=club, events=events)
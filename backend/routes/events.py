@@ -1,15 +1,21 @@
 import logging
 from datetime import date
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from ..models import db, Event, EventRegistration
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from ..models import db, Event, EventRegistration, EventFullError
 from sqlalchemy import or_, func
+from sqlalchemy.exc import IntegrityError
+from ..mail import queue_event_registration_email
+from ..search import apply_search
+from ..cache import cached_page
+from ..pagination import paginate_keyset, paginate_offset
 
 events_bp = Blueprint('events', __name__, url_prefix='/events')
 logger = logging.getLogger(__name__)
 
 @events_bp.route('/')
+@cached_page('events')
 def index():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     cas_type = request.args.get('type')
     search = request.args.get('q', '').strip()
     time_filter = request.args.get('time', 'upcoming')
@@ -23,25 +29,26 @@ def index():
     # Filter by time (upcoming/past)
     today = date.today()
     if time_filter == 'past':
-        query = query.filter(Event.event_date < today)
+        period = Event.event_date < today
     else:
-        query = query.filter(Event.event_date >= today)
+        period = Event.event_date >= today
     
-    # Search functionality
+    # Search functionality (full-text index, ranked by relevance). Ranked
+    # results are paged by offset; plain listings seek on (event_date, id),
+    # so deep pages of the past-events archive cost the same as the first
+    count = current_app.config['PAGINATION_COUNT']
     if search:
-        search_filter = or_(
-            Event.title.ilike(f'%{search}%'),
-            Event.description.ilike(f'%{search}%'),
-            Event.location.ilike(f'%{search}%'),
-            Event.organizer_name.ilike(f'%{search}%')
-        )
-        query = query.filter(search_filter)
-
-    events = query.order_by(Event.event_date.desc()).paginate(page=page, per_page=20)
+        query = (apply_search(query.filter(period), 'events', search)
+                 .order_by(Event.event_date.desc(), Event.id.desc()))
+        events = paginate_offset(query, 20, cursor, count=count)
+    else:
+        events = paginate_keyset(query, (Event.event_date, Event.id), 20, cursor,
+                                 descending=True, count=count, where=(period,))
     
     return render_template('events/index.html', events=events, selected_type=cas_type, search=search)
 
 @events_bp.route('/<int:event_id>')
+@cached_page('events', 'clubs', 'event:{event_id}')
 def detail(event_id):
     event = Event.query.get_or_404(event_id)
     
@@ -79,12 +86,7 @@ def register(event_id):
             flash('Please fill in all fields.', 'error')
             return render_template('events/register.html', event=event)
 
-        # Check if already registered
-        if EventRegistration.query.filter_by(event_id=event_id, email=email).first():
-            flash('You are already registered for this event with this email address.', 'warning')
-            return redirect(url_for('events.detail', event_id=event_id))
-
-        # Check capacity
+        # Fast path only; the capacity counter update below is authoritative
         if event.is_full():
             flash('This event is at full capacity.', 'error')
             return redirect(url_for('events.detail', event_id=event_id))
@@ -96,24 +98,24 @@ def register(event_id):
             status=status
         )
 
+        # INSERT (unique on event_id+email) and a conditional capacity UPDATE
+        # in one transaction, so concurrent requests cannot overbook. The
+        # confirmation email is queued in the same transaction and delivered
+        # by the outbox worker, so SMTP latency never reaches this request.
         db.session.add(registration)
-        db.session.commit()
-        
-        logger.info(f"New registration for event: '{event.title}' (ID: {event_id}) - Name: {full_name}, Email: {email}")
-        
-        # Send confirmation email
+        queue_event_registration_email(registration, event)
         try:
-            from ..mail import send_event_registration_email
-            # The send_event_registration_email function needs a user object, so we create a dummy one
-            class DummyUser:
-                def __init__(self, full_name, email):
-                    self.username = full_name
-                    self.email = email
-            
-            dummy_user = DummyUser(full_name, email)
-            send_event_registration_email(dummy_user, event)
-        except Exception as e:
-            logger.error(f"Failed to send registration email: {e}")
+            db.session.commit()
+        except EventFullError:
+            db.session.rollback()
+            flash('This event is at full capacity.', 'error')
+            return redirect(url_for('events.detail', event_id=event_id))
+        except IntegrityError:
+            db.session.rollback()
+            flash('You are already registered for this event with this email address.', 'warning')
+            return redirect(url_for('events.detail', event_id=event_id))
+        
+        logger.info(f"New registration for event ID {event_id} - Name: {full_name}, Email: {email}")
 
         flash('Successfully registered for the event!', 'success')
         return redirect(url_for('events.detail', event_id=event_id))
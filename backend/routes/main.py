@@ -1,10 +1,20 @@
-from flask import Blueprint, render_template, jsonify, request
-from ..models import Club, Event
-from datetime import datetime
+import hashlib
+import hmac
+from flask import Blueprint, current_app, render_template, jsonify, request
+from flask_login import current_user
+from sqlalchemy import func, select
+from ..models import db, Club, Event
+from ..utils import etag_matches
+from ..cache import cached_page
+from ..metrics import collect, render_prometheus
+from datetime import datetime, timedelta
 
 main_bp = Blueprint('main', __name__)
 
+MAX_CALENDAR_RANGE_DAYS = 400
+
 @main_bp.route('/')
+@cached_page('clubs')
 def index():
     clubs_count = Club.query.filter_by(is_active=True).count()
     return render_template('home.html', clubs_count=clubs_count)
@@ -22,12 +32,28 @@ def terms():
     return render_template('terms.html')
 
 @main_bp.route('/calendar')
+@cached_page()
 def calendar():
     return render_template('calendar.html')
 
-@main_bp.route('/api/events')
-def get_events():
-    """API endpoint to fetch events for calendar"""
+def _calendar_range():
+    """Parse ``from``/``to`` (YYYY-MM-DD, ``to`` exclusive) or ``year``/``month``
+    into a datetime range. Returns (None, error) for invalid input."""
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+
+    if date_from or date_to:
+        try:
+            start = datetime.strptime(date_from or '', '%Y-%m-%d')
+            end = datetime.strptime(date_to or '', '%Y-%m-%d')
+        except ValueError:
+            return None, 'from and to must be dates in YYYY-MM-DD format'
+        if end <= start:
+            return None, 'to must be after from'
+        if end - start > timedelta(days=MAX_CALENDAR_RANGE_DAYS):
+            return None, f'Range cannot exceed {MAX_CALENDAR_RANGE_DAYS} days'
+        return (start, end), None
+
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
     
@@ -36,27 +62,82 @@ def get_events():
         year = now.year
         month = now.month
     
+    if not 1 <= month <= 12 or not 1 <= year <= 9998:
+        return None, 'Invalid year or month'
+    
     # Get first and last day of month
     first_day = datetime(year, month, 1)
     if month == 12:
         last_day = datetime(year + 1, 1, 1)
     else:
         last_day = datetime(year, month + 1, 1)
+    return (first_day, last_day), None
+
+@main_bp.route('/api/events')
+def get_events():
+    """API endpoint to fetch events for calendar.
+
+    The ETag covers the range, the number of events in it and their latest
+    ``updated_at``, so a matching If-None-Match is answered with a 304 after
+    one aggregate query and without loading any rows.
+    """
+    date_range, error = _calendar_range()
+    if error:
+        return jsonify({'error': error}), 400
+    first_day, last_day = date_range
     
-    # Fetch events for the month
-    events = Event.query.filter(
+    filters = (
         Event.is_published == True,
         Event.event_date >= first_day,
         Event.event_date < last_day
-    ).all()
+    )
     
-    events_data = []
-    for event in events:
-        events_data.append({
+    count, latest = db.session.execute(
+        select(func.count(Event.id), func.max(Event.updated_at)).where(*filters)
+    ).one()
+    etag = hashlib.sha1(
+        f'{first_day:%Y%m%d}:{last_day:%Y%m%d}:{count}:{latest}'.encode()
+    ).hexdigest()
+    
+    if etag_matches(etag):
+        response = current_app.response_class(status=304)
+    else:
+        # Fetch only the columns the calendar uses
+        events = db.session.execute(
+            select(Event.id, Event.title, Event.event_date, Event.cas_type)
+            .where(*filters)
+            .order_by(Event.event_date)
+        ).all()
+        
+        response = jsonify([{
             'id': event.id,
             'title': event.title,
             'date': event.event_date.strftime('%Y-%m-%d'),
             'cas_type': event.cas_type.lower()
-        })
+        } for event in events])
     
-    return jsonify(events_data)
+    response.set_etag(etag)
+    # Always revalidate; unchanged ranges cost a 304
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _metrics_authorized():
+    if current_user.is_authenticated and current_user.is_admin:
+        return True
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: admins, or a bearer METRICS_TOKEN."""
+    if not _metrics_authorized():
+        response = current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response
+    body = render_prometheus(collect(current_app.config.get('METRICS_DIR')))
+    response = current_app.response_class(body, mimetype='text/plain; version=0.0.4')
+    response.cache_control.no_store = True
+    return response
@@ -0,0 +1,191 @@
+"""
+Full-text search for events and clubs
+
+PostgreSQL uses a GIN index on the weighted ``to_tsvector`` expression
+(built CONCURRENTLY, no stored column, so the table is never rewritten);
+SQLite uses external-content FTS5 tables kept in sync by triggers that fire
+only when an indexed column changes. Both are maintained by the database on
+every write (admin create, edit, delete and bulk actions included). Queries are prefix-matched on every
+term and ordered by relevance. When neither index is available the old
+ILIKE filters are used.
+"""
+import logging
+import re
+from flask import current_app
+from sqlalchemy import false, func, inspect, literal_column, or_, table, column, text
+from .models import db, Event, Club
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMS = 8
+
+# table -> {weight: columns}; A ranks highest
+SEARCH_TABLES = {
+    'events': {
+        'A': ['title'],
+        'B': ['organizer_name', 'location'],
+        'C': ['description'],
+    },
+    'clubs': {
+        'A': ['name'],
+        'B': ['leader_name', 'meeting_location'],
+        'C': ['description'],
+    },
+}
+
+FALLBACK_COLUMNS = {
+    'events': [Event.title, Event.description, Event.location, Event.organizer_name],
+    'clubs': [Club.name, Club.description, Club.leader_name, Club.meeting_location],
+}
+
+MODELS = {'events': Event, 'clubs': Club}
+
+# bm25() column weights for SQLite, mirroring the PostgreSQL setweight() labels
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0}
+
+
+def _columns(name):
+    return [col for weight in sorted(SEARCH_TABLES[name]) for col in SEARCH_TABLES[name][weight]]
+
+
+def _bm25_weights(name):
+    return [BM25_WEIGHTS[weight] for weight in sorted(SEARCH_TABLES[name]) for _ in SEARCH_TABLES[name][weight]]
+
+
+def _search_vector_sql(name, prefix=''):
+    """The weighted tsvector expression; queries must match the indexed one."""
+    parts = [
+        f"setweight(to_tsvector('simple', coalesce({prefix}{col}, '')), '{weight}')"
+        for weight, cols in sorted(SEARCH_TABLES[name].items()) for col in cols
+    ]
+    return ' || '.join(parts)
+
+
+def _postgres_index_name(name):
+    return f'ix_{name}_search'
+
+
+def _sqlite_update_trigger(name):
+    """(Re)create the update trigger, which only fires on indexed columns so
+    counter updates such as ``confirmed_count`` leave the FTS table alone."""
+    cols = _columns(name)
+    col_list = ', '.join(cols)
+    new_values = ', '.join(f'new.{col}' for col in cols)
+    old_values = ', '.join(f'old.{col}' for col in cols)
+    fts = f'{name}_fts'
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {col_list} ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def _sqlite_ddl(name):
+    cols = _columns(name)
+    col_list = ', '.join(cols)
+    new_values = ', '.join(f'new.{col}' for col in cols)
+    old_values = ', '.join(f'old.{col}' for col in cols)
+    fts = f'{name}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({col_list}, content='{name}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_values}); END",
+        *_sqlite_update_trigger(name),
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def ensure_search_index(rebuild=False):
+    """Create the search index for the current database if missing. Returns the backend name."""
+    engine = db.engine
+    dialect = engine.dialect.name
+    try:
+        inspector = inspect(engine)
+        if dialect == 'postgresql':
+            from .migrations import create_index
+            for name in SEARCH_TABLES:
+                create_index(_postgres_index_name(name), name, [f'({_search_vector_sql(name)})'], using='GIN')
+                if 'search_vector' in {c['name'] for c in inspector.get_columns(name)}:
+                    # Generated column from before the expression index; dropping
+                    # it only updates the catalog (and drops its index)
+                    with engine.begin() as conn:
+                        conn.execute(text(f'ALTER TABLE {name} DROP COLUMN IF EXISTS search_vector'))
+        elif dialect == 'sqlite':
+            existing = set(inspector.get_table_names())
+            with engine.begin() as conn:
+                for name in SEARCH_TABLES:
+                    if f'{name}_fts' not in existing:
+                        for statement in _sqlite_ddl(name):
+                            conn.execute(text(statement))
+                        continue
+                    for statement in _sqlite_update_trigger(name):
+                        conn.execute(text(statement))
+                    if rebuild:
+                        conn.execute(text(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')"))
+        else:
+            return 'ilike'
+    except Exception as e:
+        logger.warning(f"Full-text search index unavailable, using ILIKE search: {e}")
+        return 'ilike'
+
+    current_app.extensions.pop('kizuna_search', None)
+    return dialect
+
+
+def get_search_backend():
+    """Detect (once per process) which search backend the database supports."""
+    backend = current_app.extensions.get('kizuna_search')
+    if backend is None:
+        backend = 'ilike'
+        dialect = db.engine.dialect.name
+        inspector = inspect(db.engine)
+        if dialect == 'postgresql':
+            with db.engine.connect() as conn:
+                valid = conn.execute(text(
+                    'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                    'WHERE c.relname = :name AND i.indisvalid'
+                ), {'name': _postgres_index_name('events')}).first()
+            if valid:
+                backend = 'postgresql'
+        elif dialect == 'sqlite':
+            if 'events_fts' in inspector.get_table_names():
+                backend = 'sqlite'
+        current_app.extensions['kizuna_search'] = backend
+    return backend
+
+
+def search_terms(search):
+    """Split user input into at most MAX_TERMS word tokens."""
+    return re.findall(r'\w+', search.lower())[:MAX_TERMS]
+
+
+def apply_search(query, name, search, backend=None):
+    """Filter ``query`` (over the ``name`` table's model) to rows matching ``search``,
+    ordered by relevance. Callers add any secondary ordering afterwards."""
+    backend = backend or get_search_backend()
+
+    if backend == 'ilike':
+        return query.filter(or_(*[col.ilike(f'%{search}%') for col in FALLBACK_COLUMNS[name]]))
+
+    terms = search_terms(search)
+    if not terms:
+        return query.filter(false())
+
+    model = MODELS[name]
+    if backend == 'postgresql':
+        vector = literal_column(f'({_search_vector_sql(name, prefix=f"{name}.")})')
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        return (query.filter(vector.op('@@')(tsquery))
+                .order_by(func.ts_rank(vector, tsquery).desc()))
+
+    fts_name = f'{name}_fts'
+    fts = table(fts_name, column('rowid'))
+    fts_ref = literal_column(fts_name)
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return (query.join(fts, fts.c.rowid == model.id)
+            .filter(fts_ref.op('MATCH')(match))
+            .order_by(func.bm25(fts_ref, *_bm25_weights(name))))
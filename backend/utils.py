@@ -97,12 +97,9 @@ def validate_url(url, max_length=500):
     
     return True, url
 
-# Simple in-memory rate limiting (use Redis in production)
-_rate_limit_store = {}
-
 def check_rate_limit(key, max_requests=5, window_seconds=300):
     """
-    Check if a rate limit has been exceeded.
+    Check if a rate limit has been exceeded, counting this request if not.
     Returns (allowed, remaining_seconds)
     
     Args:
@@ -110,29 +107,8 @@ def check_rate_limit(key, max_requests=5, window_seconds=300):
         max_requests: Maximum requests allowed in window
         window_seconds: Time window in seconds
     """
-    import time
-    
-    current_time = time.time()
-    window_start = current_time - window_seconds
-    
-    # Clean old entries
-    if key in _rate_limit_store:
-        _rate_limit_store[key] = [
-            timestamp for timestamp in _rate_limit_store[key]
-            if timestamp > window_start
-        ]
-    else:
-        _rate_limit_store[key] = []
-    
-    # Check if limit exceeded
-    if len(_rate_limit_store[key]) >= max_requests:
-        oldest = min(_rate_limit_store[key])
-        remaining = int(oldest + window_seconds - current_time)
-        return False, max(0, remaining)
-    
-    # Record this request
-    _rate_limit_store[key].append(current_time)
-    return True, 0
+    from .ratelimit import hit
+    return hit(key, [(max_requests, window_seconds)])
 
 
 def get_client_ip():
@@ -144,3 +120,17 @@ def get_client_ip():
         return request.headers.get('X-Forwarded-For').split(',')[0].strip()
     
     return request.remote_addr
+
+
+def etag_matches(etag):
+    """Check the request's If-None-Match against ``etag``.
+
+    Flask-Compress appends the content encoding to ETags it compresses
+    ("abc" -> "abc:gzip"), so tags carrying that suffix match too.
+    """
+    from flask import request
+
+    tags = request.if_none_match
+    if tags.star_tag:
+        return True
+    return any(tag == etag or tag.startswith(etag + ':') for tag in tags.as_set(include_weak=True))
@@ -0,0 +1,62 @@
+"""
+Benchmark serverless cold starts: import + create_app(), then the first request.
+
+    python scripts/bench_cold_start.py --runs 10 --path /
+
+Each run is a fresh Python process importing the app the way api/index.py
+does, so nothing is shared between runs. Uses a temporary SQLite database
+(initialised once with ``flask kizuna init``) unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from api.index import app
+t1 = time.perf_counter()
+response = app.test_client().get(sys.argv[2])
+t2 = time.perf_counter()
+print(json.dumps({'startup': t1 - t0, 'first_request': t2 - t1, 'status': response.status_code}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('LOG_DIR', tempfile.mkdtemp())
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'cold.db')
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'kizuna', 'init'],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, '-c', CHILD, ROOT, args.path],
+                             cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    statuses = sorted({r['status'] for r in results})
+    print(f'{args.runs} cold starts of {args.path} (status {", ".join(map(str, statuses))})')
+    for name in ('startup', 'first_request'):
+        values = [r[name] * 1000 for r in results]
+        print(f'  {name:<14} median {statistics.median(values):7.1f} ms   '
+              f'min {min(values):7.1f} ms   max {max(values):7.1f} ms')
+    total = [(r['startup'] + r['first_request']) * 1000 for r in results]
+    print(f'  {"total":<14} median {statistics.median(total):7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark CPU per request with and without the compressed-response cache.
+
+    python scripts/bench_compression.py
+    python scripts/bench_compression.py --requests 500 --encoding gzip
+
+Seeds a temporary SQLite database and requests the top public routes as an
+anonymous visitor sending ``Accept-Encoding``. The page cache is on in
+both runs, so the difference is compression: "before" is stock
+Flask-Compress (gzip 6 / brotli 4 on every request, nothing cached),
+"after" is the configured COMPRESS_ROUTE_LEVELS with the body cache.
+Reports process CPU time per request and the compressed size.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from check_query_budgets import seed  # noqa: E402
+
+ROUTES = [
+    '/',
+    '/events/',
+    '/events/1',
+    '/clubs/',
+    '/calendar',
+    '/api/events?year={year}&month={month}',
+    '/static/css/style.css',
+    '/static/js/main.js',
+]
+STOCK_LEVELS = (6, 4)  # Flask-Compress defaults: COMPRESS_LEVEL, COMPRESS_BR_LEVEL
+
+
+def measure(client, path, requests, encoding):
+    headers = {'Accept-Encoding': encoding}
+    response = client.get(path, headers=headers)  # warm the page cache
+    assert response.status_code == 200, (path, response.status_code)
+    size = len(response.data)
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return (time.process_time() - start) / requests * 1000, size, response.headers.get('Content-Encoding')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='requests per route and run')
+    parser.add_argument('--encoding', default='br, gzip', help='Accept-Encoding to send')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'compression.db')
+    os.environ.setdefault('LOG_DIR', tempfile.mkdtemp())
+    os.environ.update(PAGE_CACHE_BACKEND='memory', RATE_LIMIT_ENABLED='false', SQL_PROFILER='off',
+                      LOG_TO_FILE='false')
+
+    from backend.app import create_app
+    from backend.migrations import run_migrations
+    from backend.models import db, Club, Event, EventRegistration
+
+    now = datetime.utcnow()
+    paths = [path.format(year=now.year, month=now.month) for path in ROUTES]
+
+    def make_app(stock):
+        app = create_app('development')
+        if stock:
+            app.config['COMPRESS_ROUTE_LEVELS'] = {kind: STOCK_LEVELS for kind in app.config['COMPRESS_ROUTE_LEVELS']}
+            app.extensions['kizuna_compressed_bodies'] = None
+        return app
+
+    before_app, after_app = make_app(stock=True), make_app(stock=False)
+    logging.disable(logging.CRITICAL)  # keep log formatting out of the measurement
+    with before_app.app_context():
+        run_migrations()
+        seed(db, Club, Event, EventRegistration)
+
+    before_client, after_client = before_app.test_client(), after_app.test_client()
+    print(f'{args.requests} requests per route, Accept-Encoding: {args.encoding}')
+    print(f'{"route":<34}{"before ms":>10}{"after ms":>10}{"saved":>8}{"before B":>10}{"after B":>10}  encoding')
+    totals = [0.0, 0.0]
+    for path in paths:
+        before_ms, before_size, encoding = measure(before_client, path, args.requests, args.encoding)
+        after_ms, after_size, _ = measure(after_client, path, args.requests, args.encoding)
+        totals[0] += before_ms
+        totals[1] += after_ms
+        print(f'{path:<34}{before_ms:>10.3f}{after_ms:>10.3f}{1 - after_ms / before_ms:>8.0%}'
+              f'{before_size:>10}{after_size:>10}  {encoding or "-"}')
+    print(f'{"total":<34}{totals[0]:>10.3f}{totals[1]:>10.3f}{1 - totals[1] / totals[0]:>8.0%}')
+    with after_app.app_context():
+        from backend.compression import compressed_cache_stats
+        print(f'body cache: {compressed_cache_stats()}')
+
+
+if __name__ == '__main__':
+    main()
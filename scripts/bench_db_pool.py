@@ -0,0 +1,88 @@
+"""
+Benchmark per-request latency under each DB_POOL_MODE.
+
+    DATABASE_URL=postgresql://localhost/kizuna_bench python scripts/bench_db_pool.py
+
+Each mode runs in a fresh process: the app serves --requests GETs of
+--path (page cache off, so every request hits the database) from
+--concurrency threads, then reports latency percentiles and the pool's
+checkout statistics. Point DATABASE_URL at a local or staging PostgreSQL
+(over TCP, ideally TLS) to see the connection handshake NullPool pays on
+every request; the database is initialised with ``flask kizuna init``.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, sys.argv[1])
+path, requests, concurrency = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+from backend.app import create_app
+from backend.dbpool import POOL_STATS, pool_stats
+from backend.models import db
+app = create_app('development')
+client = app.test_client()
+client.get(path)  # warm templates and mappers
+POOL_STATS.reset()
+
+def one(_):
+    start = time.perf_counter()
+    status = client.get(path).status_code
+    return time.perf_counter() - start, status
+
+t0 = time.perf_counter()
+with ThreadPoolExecutor(concurrency) as pool:
+    results = list(pool.map(one, range(requests)))
+elapsed = time.perf_counter() - t0
+latencies = sorted(r[0] * 1000 for r in results)
+with app.app_context():
+    stats = pool_stats(db.engine)
+print(json.dumps({
+    'mode': app.config['DB_POOL_MODE'],
+    'statuses': sorted({r[1] for r in results}),
+    'p50': statistics.median(latencies),
+    'p95': latencies[int(len(latencies) * 0.95) - 1],
+    'rps': requests / elapsed,
+    'pool': stats,
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--path', default='/events/')
+    parser.add_argument('--modes', default='nullpool,queue,pgbouncer')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PAGE_CACHE_BACKEND='none', RATE_LIMIT_ENABLED='false',
+               LOG_TO_FILE='false', DEBUG='false')
+    if not env.get('DATABASE_URL'):
+        print('DATABASE_URL not set: using a temporary SQLite file (no connection handshake to measure)')
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool.db')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'kizuna', 'init'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+    print(f'{args.requests} x GET {args.path}, {args.concurrency} threads')
+    print(f'{"mode":<12}{"p50 ms":>9}{"p95 ms":>9}{"req/s":>9}{"connects":>10}{"avg checkout ms":>17}')
+    for mode in args.modes.split(','):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD, ROOT, args.path, str(args.requests), str(args.concurrency)],
+            cwd=ROOT, env=dict(env, DB_POOL_MODE=mode), check=True, capture_output=True, text=True
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        pool = r['pool']
+        print(f'{r["mode"]:<12}{r["p50"]:>9.2f}{r["p95"]:>9.2f}{r["rps"]:>9.0f}'
+              f'{pool["connects"]:>10}{pool["avg_checkout_ms"]:>17.3f}')
+
+
+if __name__ == '__main__':
+    main()
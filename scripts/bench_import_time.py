@@ -0,0 +1,76 @@
+"""
+Track the app's import-time budget with ``python -X importtime``.
+
+    python scripts/bench_import_time.py --runs 5 --budget-ms 700
+
+Imports api.index (module import + create_app(), as a serverless cold
+start does) in fresh processes, and reports the median total and the
+packages that cost the most. With --budget-ms the script exits non-zero
+when the median total exceeds the budget, so it can guard CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(env):
+    """{module: (self_us, cumulative_us)} for one cold import of api.index."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from api.index import app'],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--budget-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('LOG_DIR', tempfile.mkdtemp())
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'import.db'))
+
+    runs = [import_times(env) for _ in range(args.runs)]
+    totals = [run['api.index'][1] / 1000 for run in runs]
+    total = statistics.median(totals)
+
+    # Self time per top-level package, median across runs
+    packages = defaultdict(list)
+    for run in runs:
+        per_run = defaultdict(int)
+        for name, (self_us, _) in run.items():
+            per_run[name.split('.')[0]] += self_us
+        for package, self_us in per_run.items():
+            packages[package].append(self_us / 1000)
+
+    print(f'import api.index (incl. create_app): median {total:.1f} ms '
+          f'(min {min(totals):.1f}, max {max(totals):.1f}) over {args.runs} runs')
+    print(f'{"package":<24}{"self ms":>10}')
+    ranked = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+    for package, values in ranked[:args.top]:
+        print(f'{package:<24}{statistics.median(values):>10.1f}')
+
+    if args.budget_ms is not None:
+        if total > args.budget_ms:
+            print(f'OVER BUDGET: {total:.1f} ms > {args.budget_ms:.1f} ms')
+            sys.exit(1)
+        print(f'within budget ({args.budget_ms:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark the rate limiter: sliding-window counters vs. the previous
+per-key timestamp lists.
+
+    python scripts/bench_rate_limit.py --keys 100000 --hits 200000
+
+Reports hits per second for one hot key (a brute-forced login) and for
+many distinct keys (a crawl from many IPs), plus the memory held after
+the many-keys run. The SQL backend runs against a temporary SQLite
+database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LIMITS = [(5, 60), (20, 3600)]
+
+
+class TimestampListLimiter:
+    """The previous implementation: a list of timestamps per key, never evicted."""
+
+    name = 'timestamp lists'
+
+    def __init__(self):
+        self.store = {}
+
+    def hit(self, key, limits):
+        allowed = True
+        for max_requests, window_seconds in limits:
+            slot = f'{key}|{window_seconds}'
+            current_time = time.time()
+            window_start = current_time - window_seconds
+            self.store[slot] = [t for t in self.store.get(slot, []) if t > window_start]
+            if len(self.store[slot]) >= max_requests:
+                min(self.store[slot])
+                allowed = False
+                continue
+            self.store[slot].append(current_time)
+        return allowed, 0
+
+
+def run(limiter, keys, hits):
+    start = time.perf_counter()
+    for i in range(hits):
+        limiter.hit(keys[i % len(keys)], LIMITS)
+    return hits / (time.perf_counter() - start)
+
+
+def measure(factory, args):
+    keys = [f'login:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(args.keys)]
+    hot = run(factory(), ['login:10.0.0.1'], args.hits)
+    many = run(factory(), keys, max(args.hits, args.keys))
+
+    # Memory is measured on a separate run; tracing allocations skews the timings
+    tracemalloc.start()
+    limiter = factory()
+    run(limiter, keys, args.keys)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return hot, many, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--sql-hits', type=int, default=5000)
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ.setdefault('LOG_DIR', tempfile.mkdtemp())
+
+    from backend.app import create_app
+    from backend.migrations import run_migrations
+    from backend.ratelimit import MemoryRateLimitBackend, SQLRateLimitBackend
+
+    print(f'{"backend":<24}{"hot key hits/s":>16}{"many keys hits/s":>18}{"memory":>12}')
+    for factory in (TimestampListLimiter, lambda: MemoryRateLimitBackend(max_keys=10000)):
+        limiter = factory()
+        hot, many, memory = measure(factory, args)
+        print(f'{getattr(limiter, "name"):<24}{hot:>16,.0f}{many:>18,.0f}{memory / 1024:>10,.0f}KB')
+
+    app = create_app('production' if os.getenv('FLASK_ENV') == 'production' else 'development')
+    with app.app_context():
+        run_migrations()
+        backend = SQLRateLimitBackend()
+        backend.reset()
+        sql_args = argparse.Namespace(keys=min(args.keys, args.sql_hits), hits=args.sql_hits)
+        hot, many, _ = measure(lambda: backend, sql_args)
+        print(f'{"sql (" + app.extensions["sqlalchemy"].engines[None].dialect.name + ")":<24}'
+              f'{hot:>16,.0f}{many:>18,.0f}{"-":>12}')
+        backend.reset()
+
+
+if __name__ == '__main__':
+    main()
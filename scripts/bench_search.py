@@ -0,0 +1,92 @@
+"""
+Benchmark event search: full-text index vs. the previous ILIKE '%q%' filters.
+
+    python scripts/bench_search.py --events 100000
+
+Seeds a temporary SQLite database by default (FTS5); set DATABASE_URL to
+benchmark PostgreSQL (tsvector + GIN). The seeded rows are removed again
+unless --keep is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('beach cleanup robotics debate chess orchestra choir tutoring garden '
+         'marathon charity bake sale coding workshop drama rehearsal science fair '
+         'model united nations volunteering shelter football basketball art '
+         'exhibition photography recycling mentoring library reading festival').split()
+LOCATIONS = ['Gym', 'Library', 'Auditorium', 'Room 101', 'Science Lab', 'Courtyard', 'City Park']
+QUERIES = ['robotics', 'beach clean', 'chess tournament', 'photo', 'xyzzy']
+
+
+def sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    from backend.app import create_app
+    from backend.migrations import run_migrations
+    from backend.models import db, Event
+    from backend.search import apply_search, ensure_search_index, get_search_backend
+
+    app = create_app('development')
+    with app.app_context():
+        run_migrations()
+        rng = random.Random(42)
+        start = datetime.utcnow()
+        marker = f'bench-{int(time.time())}'
+        t0 = time.perf_counter()
+        for offset in range(0, args.events, 5000):
+            db.session.execute(db.insert(Event), [{
+                'title': sentence(rng, 4).title(),
+                'description': sentence(rng, 60),
+                'cas_type': rng.choice(['Creativity', 'Activity', 'Service']),
+                'event_date': start + timedelta(hours=rng.randint(-8760, 8760)),
+                'location': rng.choice(LOCATIONS),
+                'organizer_name': marker,
+                'is_published': True,
+            } for _ in range(min(5000, args.events - offset))])
+            db.session.commit()
+        ensure_search_index(rebuild=True)
+        print(f'Seeded {args.events} events in {time.perf_counter() - t0:.1f}s '
+              f'({db.engine.dialect.name}, search backend: {get_search_backend()})')
+
+        def run(backend, q):
+            query = Event.query.filter_by(is_published=True)
+            query = apply_search(query, 'events', q, backend=backend)
+            timings = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                page = query.order_by(Event.event_date.desc()).paginate(page=1, per_page=20, error_out=False)
+                timings.append((time.perf_counter() - t) * 1000)
+            return statistics.median(timings), page.total
+
+        print(f"{'query':<20}{'ilike ms':>12}{'hits':>8}{'fts ms':>12}{'hits':>8}{'speedup':>10}")
+        for q in QUERIES:
+            ilike_ms, ilike_hits = run('ilike', q)
+            fts_ms, fts_hits = run(get_search_backend(), q)
+            print(f'{q:<20}{ilike_ms:>12.1f}{ilike_hits:>8}{fts_ms:>12.1f}{fts_hits:>8}{ilike_ms / fts_ms:>9.1f}x')
+
+        if not args.keep:
+            Event.query.filter_by(organizer_name=marker).delete(synchronize_session=False)
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Check each page's SQL query budget.
+
+    python scripts/check_query_budgets.py            # fail if any page goes over
+    python scripts/check_query_budgets.py --report   # show every page's queries
+
+Seeds a temporary SQLite database with clubs, events and registrations,
+requests every page with the page cache off (admin pages as a logged-in
+admin) and fails when a page runs more queries than its budget below, or
+repeats one statement more than SQL_REPEAT_THRESHOLD times (an N+1).
+Lower a budget when a page gets cheaper; raising one should be a
+deliberate decision in review.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (path, max queries); the budget holds however many rows the page lists
+PUBLIC_BUDGETS = [
+    ('/', 1),
+    ('/events/', 2),
+    ('/events/?time=past', 2),
+    ('/events/?q=club', 3),
+    ('/events/1', 3),
+    ('/events/1/register', 1),
+    ('/clubs/', 2),
+    ('/clubs/1', 4),
+    ('/clubs/1/past', 3),
+    ('/calendar', 0),
+    ('/api/events', 2),
+]
+# Each includes loading the admin's users row, which admin pages never take
+# from the session snapshot (backend/identity.py)
+ADMIN_BUDGETS = [
+    ('/admin/', 2),
+    ('/admin/events', 3),
+    ('/admin/events/create', 2),
+    ('/admin/events/1/edit', 3),
+    ('/admin/clubs', 3),
+    ('/admin/clubs/1/edit', 2),
+    ('/admin/events/1/participants', 3),
+    ('/admin/events/1/participants/print', 3),
+    ('/admin/newsletters', 4),
+]
+
+
+def seed(db, Club, Event, EventRegistration, clubs=6, events_per_club=8, registrations=5):
+    now = datetime.utcnow()
+    for c in range(clubs):
+        club = Club(name=f'Club {c}', description='A club', meeting_day='Monday')
+        db.session.add(club)
+        db.session.flush()
+        for e in range(events_per_club):
+            event = Event(title=f'Club {c} event {e}', description='An event', cas_type='Service,Activity',
+                          event_date=now + timedelta(days=e - events_per_club // 2, hours=c),
+                          location='Hall', max_capacity=50, club_id=club.id, is_published=True)
+            db.session.add(event)
+            db.session.flush()
+            for r in range(registrations):
+                db.session.add(EventRegistration(event_id=event.id, email=f'student{r}@example.com',
+                                                 full_name=f'Student {r}'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--report', action='store_true', help='print each page\'s statements')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'budgets.db')
+    os.environ.setdefault('LOG_DIR', tempfile.mkdtemp())
+    os.environ.update(PAGE_CACHE_BACKEND='none', RATE_LIMIT_ENABLED='false', SQL_PROFILER='off')
+
+    from backend.app import create_app
+    from backend.cli import ensure_admin_user
+    from backend.migrations import run_migrations
+    from backend.models import db, Club, Event, EventRegistration
+    from backend.profiler import profile_queries
+
+    app = create_app('development')
+    app.config['WTF_CSRF_ENABLED'] = False
+    threshold = app.config['SQL_REPEAT_THRESHOLD']
+    with app.app_context():
+        run_migrations()
+        ensure_admin_user('admin', 'budget-check')
+        seed(db, Club, Event, EventRegistration)
+
+    client = app.test_client()
+    failures = 0
+
+    def check(path, budget):
+        nonlocal failures
+        with profile_queries() as log:
+            status = client.get(path).status_code
+        problems = []
+        if status != 200:
+            problems.append(f'status {status}')
+        if log.count > budget:
+            problems.append(f'over budget ({budget})')
+        if log.repeated(threshold):
+            problems.append(f'statement repeated more than {threshold} times')
+        failures += bool(problems)
+        print(f'{"FAIL" if problems else "ok":<6}{log.count:>3} / {budget:<3} {path}'
+              + (f'  [{"; ".join(problems)}]' if problems else ''))
+        if args.report or problems:
+            print('\n'.join('        ' + line for line in log.report().splitlines()))
+
+    for path, budget in PUBLIC_BUDGETS:
+        check(path, budget)
+    client.post('/auth/login', data={'username': 'admin', 'password': 'budget-check'})
+    for path, budget in ADMIN_BUDGETS:
+        check(path, budget)
+
+    if failures:
+        print(f'{failures} page(s) failed their query budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Print the query plan for each route's hot queries on a seeded dataset.
+
+    python scripts/explain_queries.py --events 20000
+
+Seeds a temporary SQLite database by default (EXPLAIN QUERY PLAN); set
+DATABASE_URL to check PostgreSQL plans (EXPLAIN) after ``flask kizuna
+migrate``. Look for full scans ("SCAN events", "Seq Scan") on the
+filtered tables.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, models, n_events, rng):
+    Club, Event, EventRegistration = models
+    now = datetime.utcnow()
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    db.session.execute(db.insert(Club), [
+        {'name': f'Club {i}', 'description': 'Seeded club', 'meeting_day': rng.choice(days),
+         'is_active': rng.random() > 0.1} for i in range(200)
+    ])
+    db.session.execute(db.insert(Event), [
+        {'title': f'Event {i}', 'description': 'Seeded event', 'cas_type': rng.choice(['Creativity', 'Activity', 'Service']),
+         'event_date': now + timedelta(hours=rng.randint(-17520, 4380)), 'club_id': rng.randint(1, 200),
+         'is_published': rng.random() > 0.2} for i in range(n_events)
+    ])
+    db.session.execute(db.insert(EventRegistration), [
+        {'event_id': rng.randint(1, n_events), 'email': f'student{i}@example.com',
+         'status': rng.choice(['confirmed', 'confirmed', 'maybe', 'cancelled']),
+         'registered_at': now - timedelta(minutes=i)} for i in range(n_events * 3)
+    ])
+    db.session.commit()
+
+
+def route_queries(db, models):
+    """(route, description, SQLAlchemy statement) for the hot query shapes."""
+    from sqlalchemy import func, or_, select
+    Club, Event, EventRegistration = models
+    now = datetime.utcnow()
+    month_start = datetime(now.year, now.month, 1)
+    return [
+        ('events.index', 'upcoming published events',
+         select(Event).where(Event.is_published.is_(True), Event.event_date >= now)
+         .order_by(Event.event_date.desc()).limit(20)),
+        ('events.index', 'past published events',
+         select(Event).where(Event.is_published.is_(True), Event.event_date < now)
+         .order_by(Event.event_date.desc()).limit(20)),
+        ('events.detail', 'related events',
+         select(Event).where(Event.id != 1, Event.is_published.is_(True), Event.event_date >= now,
+                             or_(Event.cas_type == 'Service', Event.club_id == 1))
+         .order_by(Event.event_date.asc()).limit(3)),
+        ('main.get_events', 'calendar month',
+         select(Event.id, Event.title, Event.event_date, Event.cas_type)
+         .where(Event.is_published.is_(True), Event.event_date >= month_start,
+                Event.event_date < month_start + timedelta(days=31))),
+        ('kizuna recount', 'confirmed registrations for an event',
+         select(func.count(EventRegistration.id))
+         .where(EventRegistration.event_id == 1, EventRegistration.status == 'confirmed')),
+        ('admin.event_participants', 'participants in registration order',
+         select(EventRegistration).where(EventRegistration.event_id == 1)
+         .order_by(EventRegistration.registered_at)),
+        ('events.register', 'duplicate registration check (unique index)',
+         select(EventRegistration.id).where(EventRegistration.event_id == 1,
+                                            EventRegistration.email == 'student1@example.com')),
+        ('clubs.index', 'active clubs meeting on a day',
+         select(Club).where(Club.is_active.is_(True), Club.meeting_day == 'Monday').limit(12)),
+        ('clubs.index', 'event count per club',
+         select(func.count(Event.id)).where(Event.club_id == 1)),
+        ('clubs.detail', 'club events by date',
+         select(Event).where(Event.club_id == 1).order_by(Event.event_date)),
+    ]
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.exec_driver_sql(prefix + str(compiled), params).fetchall()
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--no-seed', action='store_true', help='Use the existing data as-is.')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain.db')
+
+    from backend.app import create_app
+    from backend.migrations import run_migrations
+    from backend.models import db, Club, Event, EventRegistration
+
+    models = (Club, Event, EventRegistration)
+    app = create_app('development')
+    with app.app_context():
+        run_migrations()
+        if not args.no_seed:
+            seed(db, models, args.events, random.Random(7))
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('ANALYZE')
+            for route, description, stmt in route_queries(db, models):
+                print(f'== {route}: {description}')
+                for line in explain(conn, stmt):
+                    print(f'   {line}')
+                print()
+
+
+if __name__ == '__main__':
+    main()
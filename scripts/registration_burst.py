@@ -0,0 +1,97 @@
+"""
+Burst-load check for event registration capacity.
+
+Fires many parallel registrations at a single event and asserts that the
+number of confirmed registrations equals the event's capacity exactly.
+
+    python scripts/registration_burst.py --requests 300 --capacity 50
+
+Uses a temporary SQLite file by default; set DATABASE_URL to run the same
+check against PostgreSQL.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config import TestingConfig, get_database_url
+
+
+def build_app(database_url):
+    from backend.app import create_app
+    from backend.config import config
+
+    class BurstConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 32, 'max_overflow': 64}
+        if database_url.startswith('sqlite'):
+            SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+
+    config['burst'] = BurstConfig
+    return create_app('burst')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--capacity', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=64)
+    args = parser.parse_args()
+
+    if os.getenv('DATABASE_URL'):
+        database_url = get_database_url()
+    else:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'burst.db')
+
+    app = build_app(database_url)
+
+    from backend.models import db, Event, EventRegistration
+    with app.app_context():
+        db.create_all()
+        event = Event(title='Burst test', cas_type='Service',
+                      event_date=datetime.utcnow() + timedelta(days=7),
+                      max_capacity=args.capacity, is_published=True)
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+
+    def register(i):
+        client = app.test_client()
+        return client.post(f'/events/{event_id}/register', data={
+            'full_name': f'Student {i}',
+            'email': f'student{i}@example.com',
+            'status': 'confirmed',
+        }).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = list(pool.map(register, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        confirmed = EventRegistration.query.filter_by(event_id=event_id, status='confirmed').count()
+        counter = db.session.get(Event, event_id).confirmed_count
+        db.session.query(EventRegistration).filter_by(event_id=event_id).delete()
+        db.session.query(Event).filter_by(id=event_id).delete()
+        db.session.commit()
+
+    errors = sum(1 for s in statuses if s >= 500)
+    print(f'{args.requests} registrations in {elapsed:.2f}s '
+          f'({args.requests / elapsed:.0f} req/s), {errors} server errors')
+    print(f'capacity={args.capacity} confirmed_rows={confirmed} confirmed_count={counter}')
+
+    expected = min(args.capacity, args.requests)
+    if confirmed != expected or counter != expected or errors:
+        print('FAIL')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Minimal local SMTP server that accepts every message and prints it.
+
+A stand-in mail server for development and for exercising the outbox
+worker without a real SMTP account:
+
+    python scripts/smtp_sink.py --port 1025
+    MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 flask kizuna outbox --once
+
+--delay simulates a slow server, --fail-rate makes a fraction of messages
+fail with a 451 so retries and dead-lettering can be observed.
+"""
+import argparse
+import random
+import socketserver
+import time
+from email import message_from_bytes
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+    quiet = False
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 kizuna-smtp-sink ready')
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 kizuna-smtp-sink')
+            elif verb == 'MAIL':
+                mail_from, rcpt_to = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt_to.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                time.sleep(self.delay)
+                if random.random() < self.fail_rate:
+                    self.reply('451 Simulated temporary failure')
+                    continue
+                message = message_from_bytes(b''.join(data))
+                if not self.quiet:
+                    print(f"[{time.strftime('%H:%M:%S')}] {mail_from} -> {', '.join(rcpt_to)}: "
+                          f"{message.get('Subject')}", flush=True)
+                self.reply('250 Message accepted')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SMTP sink for Kizuna development')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait per message')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of messages to reject')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    SMTPSinkHandler.delay = args.delay
+    SMTPSinkHandler.fail_rate = args.fail_rate
+    SMTPSinkHandler.quiet = args.quiet
+
+    with SMTPSink((args.host, args.port), SMTPSinkHandler) as server:
+        print(f'SMTP sink listening on {args.host}:{args.port}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
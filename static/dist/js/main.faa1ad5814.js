@@ -0,0 +1,362 @@
+document.addEventListener('DOMContentLoaded', function() {
+const cardsGrid = document.querySelector('.cards-grid');
+const viewToggleBtns = document.querySelectorAll('.view-toggle-btn');
+if (cardsGrid && viewToggleBtns.length > 0) {
+const savedView = localStorage.getItem('eventsViewPreference') ||'grid';
+if (savedView ==='list') {
+cardsGrid.classList.add('list-view');
+viewToggleBtns.forEach(function(btn) {
+btn.classList.toggle('active', btn.dataset.view ==='list');
+});
+}
+viewToggleBtns.forEach(function(btn) {
+btn.addEventListener('click', function() {
+const view = btn.dataset.view;
+viewToggleBtns.forEach(function(b) {
+b.classList.remove('active');
+});
+btn.classList.add('active');
+if (view ==='list') {
+cardsGrid.classList.add('list-view');
+} else {
+cardsGrid.classList.remove('list-view');
+}
+localStorage.setItem('eventsViewPreference', view);
+});
+});
+}
+const skipLink = document.querySelector('.skip-link');
+const mainContent = document.getElementById('main-content');
+if (skipLink && mainContent) {
+skipLink.addEventListener('click', function(e) {
+e.preventDefault();
+mainContent.focus();
+});
+}
+const navToggle = document.getElementById('navToggle');
+const navMenu = document.getElementById('navMenu');
+if (navToggle && navMenu) {
+navToggle.addEventListener('click', function() {
+const isOpen = navMenu.classList.toggle('active');
+navToggle.setAttribute('aria-expanded', isOpen);
+});
+document.addEventListener('keydown', function(e) {
+if (e.key ==='Escape'&& navMenu.classList.contains('active')) {
+navMenu.classList.remove('active');
+navToggle.setAttribute('aria-expanded','false');
+navToggle.focus();
+}
+});
+}
+const navLinks = document.querySelectorAll('.nav-link');
+const currentPath = window.location.pathname;
+navLinks.forEach(function(link) {
+if (link.getAttribute('href') === currentPath) {
+link.classList.add('active');
+link.setAttribute('aria-current','page');
+}
+});
+const alertContainer = document.querySelector('.alert-container');
+const alerts = document.querySelectorAll('.alert');
+alerts.forEach(function(alert) {
+const closeBtn = alert.querySelector('.alert-close');
+if (closeBtn) {
+closeBtn.addEventListener('click', function() {
+alert.style.animation ='slideOut 0.3s ease forwards';
+setTimeout(function() {
+alert.remove();
+if (alertContainer && alertContainer.children.length === 0) {
+alertContainer.remove();
+}
+}, 300);
+});
+}
+setTimeout(function() {
+if (alert && alert.parentNode) {
+alert.style.animation ='slideOut 0.3s ease forwards';
+setTimeout(function() {
+if (alert.parentNode) {
+alert.remove();
+if (alertContainer && alertContainer.children.length === 0) {
+alertContainer.remove();
+}
+}
+}, 300);
+}
+}, 5000);
+});
+const forms = document.querySelectorAll('form[data-loading]');
+forms.forEach(function(form) {
+form.addEventListener('submit', function() {
+const submitBtn = form.querySelector('button[type="submit"]');
+if (submitBtn && !submitBtn.classList.contains('btn-loading')) {
+submitBtn.classList.add('btn-loading');
+submitBtn.disabled = true;
+submitBtn.dataset.originalText = submitBtn.textContent;
+submitBtn.textContent ='Loading...';
+}
+});
+});
+const loadingBtns = document.querySelectorAll('.btn[data-loading="true"]');
+loadingBtns.forEach(function(btn) {
+btn.addEventListener('click', function() {
+if (!btn.classList.contains('btn-loading')) {
+btn.classList.add('btn-loading');
+btn.disabled = true;
+btn.dataset.originalText = btn.textContent;
+btn.innerHTML ='<span class="spinner"></span> Loading...';
+}
+});
+});
+const calendarDays = document.getElementById('calendarDays');
+const calendarTitle = document.getElementById('calendarTitle');
+const prevBtn = document.getElementById('prevMonth');
+const nextBtn = document.getElementById('nextMonth');
+const todayBtn = document.getElementById('todayBtn');
+if (calendarDays && calendarTitle) {
+let currentDate = new Date();
+const monthNames = ['January','February','March','April','May','June',
+'July','August','September','October','November','December'];
+const isLarge = calendarDays.dataset.calendarSize ==='large';
+const dayClass = isLarge ?'calendar-day-large':'calendar-day';
+const dayHeaderClass = isLarge ?'calendar-day-header-large':'calendar-day-header';
+const dayNumberClass = isLarge ?'calendar-day-number-large':'calendar-day-number';
+const dayContentClass = isLarge ?'calendar-events-list':'calendar-day-content';
+const eventClass = isLarge ?'calendar-event-large':'calendar-event';
+const maxEvents = isLarge ? 4 : 3;
+function renderCalendar(date, events) {
+const year = date.getFullYear();
+const month = date.getMonth();
+calendarTitle.textContent = monthNames[month] +' '+ year;
+const firstDay = new Date(year, month, 1);
+const lastDay = new Date(year, month + 1, 0);
+const startDay = firstDay.getDay();
+const daysInMonth = lastDay.getDate();
+const daysInPrevMonth = new Date(year, month, 0).getDate();
+const today = new Date();
+const todayStr = today.getFullYear() +'-'+
+String(today.getMonth() + 1).padStart(2,'0') +'-'+
+String(today.getDate()).padStart(2,'0');
+const eventsByDate = {};
+if (events) {
+events.forEach(function(event) {
+if (!eventsByDate[event.date]) {
+eventsByDate[event.date] = [];
+}
+eventsByDate[event.date].push(event);
+});
+}
+const totalCells = 42;
+let html ='';
+let dayCount = 1;
+let nextMonthDay = 1;
+for (let i = 0; i < totalCells; i++) {
+let dayNumber;
+let isOtherMonth = false;
+let isToday = false;
+let dateStr ='';
+if (i < startDay) {
+dayNumber = daysInPrevMonth - startDay + i + 1;
+isOtherMonth = true;
+} else if (dayCount > daysInMonth) {
+dayNumber = nextMonthDay;
+nextMonthDay++;
+isOtherMonth = true;
+} else {
+dayNumber = dayCount;
+const m = String(month + 1).padStart(2,'0');
+const d = String(dayCount).padStart(2,'0');
+dateStr = year +'-'+ m +'-'+ d;
+if (dateStr === todayStr) {
+isToday = true;
+}
+dayCount++;
+}
+const classes = [dayClass];
+if (isOtherMonth) classes.push('other-month');
+if (isToday) classes.push('today');
+html +='<div class="'+ classes.join(' ') +'" data-date="'+ dateStr +'" tabindex="0" role="button" aria-label="'+ (dateStr ? new Date(dateStr).toLocaleDateString('en-US', { weekday:'long', month:'long', day:'numeric'}) :'') +'">';
+html +='<div class="'+ dayHeaderClass +'">';
+html +='<span class="'+ dayNumberClass +'">'+ dayNumber +'</span>';
+html +='</div>';
+html +='<div class="'+ dayContentClass +'">';
+if (dateStr && eventsByDate[dateStr]) {
+const visibleEvents = eventsByDate[dateStr].slice(0, maxEvents);
+visibleEvents.forEach(function(event) {
+const cas_types = event.cas_type.split(',');
+const primary_cas_type = cas_types[0].toLowerCase();
+html +='<a href="/events/'+ event.id +'" class="'+ eventClass +' cas-'+ primary_cas_type +'" title="'+ event.title +'">';
+html += event.title;
+html +='</a>';
+});
+if (isLarge && eventsByDate[dateStr].length > maxEvents) {
+html +='<span class="calendar-more-events">+'+ (eventsByDate[dateStr].length - maxEvents) +' more</span>';
+}
+}
+html +='</div>';
+html +='</div>';
+}
+calendarDays.innerHTML = html;
+}
+function fetchEvents(year, month) {
+calendarDays.style.opacity ='0.5';
+const shownDate = new Date(currentDate);
+fetchCalendarEvents(year, month)
+.then(function(events) {
+if (calendarMonthKey(shownDate) !== calendarMonthKey(currentDate)) {
+return;
+}
+renderCalendar(shownDate, events);
+calendarDays.style.opacity ='1';
+})
+.catch(function(error) {
+console.error('Error fetching events:', error);
+renderCalendar(currentDate, []);
+calendarDays.style.opacity ='1';
+});
+}
+function loadCalendar() {
+const year = currentDate.getFullYear();
+const month = currentDate.getMonth() + 1;
+fetchEvents(year, month);
+}
+if (prevBtn) {
+prevBtn.addEventListener('click', function() {
+currentDate.setMonth(currentDate.getMonth() - 1);
+loadCalendar();
+});
+}
+if (nextBtn) {
+nextBtn.addEventListener('click', function() {
+currentDate.setMonth(currentDate.getMonth() + 1);
+loadCalendar();
+});
+}
+if (todayBtn) {
+todayBtn.addEventListener('click', function() {
+currentDate = new Date();
+loadCalendar();
+});
+}
+document.addEventListener('keydown', function(e) {
+if (document.activeElement && document.activeElement.classList.contains(dayClass)) {
+if (e.key ==='ArrowLeft') {
+currentDate.setMonth(currentDate.getMonth() - 1);
+loadCalendar();
+} else if (e.key ==='ArrowRight') {
+currentDate.setMonth(currentDate.getMonth() + 1);
+loadCalendar();
+}
+}
+});
+loadCalendar();
+}
+const searchInputs = document.querySelectorAll('.search-input');
+searchInputs.forEach(function(input) {
+let debounceTimer;
+input.addEventListener('input', function() {
+clearTimeout(debounceTimer);
+const form = input.closest('form');
+if (form && input.value.length >= 2) {
+input.classList.add('searching');
+} else {
+input.classList.remove('searching');
+}
+});
+});
+const userDropdown = document.querySelector('.user-dropdown');
+const userAvatar = document.querySelector('.user-avatar');
+if (userDropdown && userAvatar) {
+userAvatar.addEventListener('click', function(e) {
+e.stopPropagation();
+const isOpen = userDropdown.classList.toggle('active');
+userAvatar.setAttribute('aria-expanded', isOpen);
+});
+document.addEventListener('click', function(e) {
+if (userDropdown.classList.contains('active') && !userDropdown.contains(e.target)) {
+userDropdown.classList.remove('active');
+userAvatar.setAttribute('aria-expanded','false');
+}
+});
+document.addEventListener('keydown', function(e) {
+if (e.key ==='Escape'&& userDropdown.classList.contains('active')) {
+userDropdown.classList.remove('active');
+userAvatar.setAttribute('aria-expanded','false');
+userAvatar.focus();
+}
+});
+}
+});
+function resetButtonState(btn) {
+if (btn && btn.dataset.originalText) {
+btn.textContent = btn.dataset.originalText;
+btn.classList.remove('btn-loading');
+btn.disabled = false;
+}
+}
+const calendarCache = {};
+function calendarMonthKey(date) {
+return date.getFullYear() +'-'+ String(date.getMonth() + 1).padStart(2,'0');
+}
+function calendarIsoDate(date) {
+return calendarMonthKey(date) +'-'+ String(date.getDate()).padStart(2,'0');
+}
+function fetchCalendarEvents(year, month) {
+const missing = [-1, 0, 1].map(function(offset) {
+return new Date(year, month - 1 + offset, 1);
+}).filter(function(date) {
+return !calendarCache[calendarMonthKey(date)];
+});
+if (missing.length) {
+const from = missing[0];
+const last = missing[missing.length - 1];
+const to = new Date(last.getFullYear(), last.getMonth() + 1, 1);
+const request = fetch('/api/events?from='+ calendarIsoDate(from) +'&to='+ calendarIsoDate(to))
+.then(function(response) {
+if (!response.ok) {
+throw new Error('HTTP '+ response.status);
+}
+return response.json();
+});
+missing.forEach(function(date) {
+const key = calendarMonthKey(date);
+calendarCache[key] = request.then(function(events) {
+return events.filter(function(event) {
+return event.date.slice(0, 7) === key;
+});
+});
+calendarCache[key].catch(function() {
+delete calendarCache[key];
+});
+});
+}
+return calendarCache[calendarMonthKey(new Date(year, month - 1, 1))];
+}
+const style = document.createElement('style');
+style.textContent ='@keyframes slideOut { from { transform: translateX(0); opacity: 1; } to { transform: translateX(100%); opacity: 0; } }';
+document.head.appendChild(style);
+document.addEventListener('DOMContentLoaded', function() {
+const faqItems = document.querySelectorAll('.faq-item');
+faqItems.forEach(function(item) {
+const question = item.querySelector('.faq-question');
+if (question) {
+question.addEventListener('click', function() {
+const isOpen = item.classList.contains('active');
+faqItems.forEach(function(otherItem) {
+if (otherItem !== item) {
+otherItem.classList.remove('active');
+otherItem.querySelector('.faq-question').setAttribute('aria-expanded','false');
+}
+});
+item.classList.toggle('active', !isOpen);
+question.setAttribute('aria-expanded', !isOpen);
+});
+question.addEventListener('keydown', function(e) {
+if (e.key ==='Enter'|| e.key ===' ') {
+e.preventDefault();
+question.click();
+}
+});
+}
+});
+});
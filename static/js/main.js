@@ -137,16 +137,25 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Calendar functionality
+    // Calendar functionality (home page mini calendar and the calendar page,
+    // which sets data-calendar-size="large" on the grid)
     const calendarDays = document.getElementById('calendarDays');
     const calendarTitle = document.getElementById('calendarTitle');
     const prevBtn = document.getElementById('prevMonth');
     const nextBtn = document.getElementById('nextMonth');
+    const todayBtn = document.getElementById('todayBtn');
     
     if (calendarDays && calendarTitle) {
         let currentDate = new Date();
         const monthNames = ['January', 'February', 'March', 'April', 'May', 'June',
                            'July', 'August', 'September', 'October', 'November', 'December'];
+        const isLarge = calendarDays.dataset.calendarSize === 'large';
+        const dayClass = isLarge ? 'calendar-day-large' : 'calendar-day';
+        const dayHeaderClass = isLarge ? 'calendar-day-header-large' : 'calendar-day-header';
+        const dayNumberClass = isLarge ? 'calendar-day-number-large' : 'calendar-day-number';
+        const dayContentClass = isLarge ? 'calendar-events-list' : 'calendar-day-content';
+        const eventClass = isLarge ? 'calendar-event-large' : 'calendar-event';
+        const maxEvents = isLarge ? 4 : 3;
         
         function renderCalendar(date, events) {
             const year = date.getFullYear();
@@ -208,28 +217,29 @@ document.addEventListener('DOMContentLoaded', function() {
                     dayCount++;
                 }
                 
-                const classes = ['calendar-day'];
+                const classes = [dayClass];
                 if (isOtherMonth) classes.push('other-month');
                 if (isToday) classes.push('today');
                 
-                const eventCount = eventsByDate[dateStr] ? eventsByDate[dateStr].length : 0;
-                
                 html += '<div class="' + classes.join(' ') + '" data-date="' + dateStr + '" tabindex="0" role="button" aria-label="' + (dateStr ? new Date(dateStr).toLocaleDateString('en-US', { weekday: 'long', month: 'long', day: 'numeric' }) : '') + '">';
-                html += '<div class="calendar-day-header">';
-                html += '<span class="calendar-day-number">' + dayNumber + '</span>';
+                html += '<div class="' + dayHeaderClass + '">';
+                html += '<span class="' + dayNumberClass + '">' + dayNumber + '</span>';
                 html += '</div>';
-                html += '<div class="calendar-day-content">';
+                html += '<div class="' + dayContentClass + '">';
                 
-                // Add events for this date (max 3 visible)
+                // Add events for this date (maxEvents visible)
                 if (dateStr && eventsByDate[dateStr]) {
-                    const visibleEvents = eventsByDate[dateStr].slice(0, 3);
+                    const visibleEvents = eventsByDate[dateStr].slice(0, maxEvents);
                     visibleEvents.forEach(function(event) {
                         const cas_types = event.cas_type.split(',');
                         const primary_cas_type = cas_types[0].toLowerCase();
-                        html += '<a href="/events/' + event.id + '" class="calendar-event cas-' + primary_cas_type + '" title="' + event.title + '">';
+                        html += '<a href="/events/' + event.id + '" class="' + eventClass + ' cas-' + primary_cas_type + '" title="' + event.title + '">';
                         html += event.title;
                         html += '</a>';
                     });
+                    if (isLarge && eventsByDate[dateStr].length > maxEvents) {
+                        html += '<span class="calendar-more-events">+' + (eventsByDate[dateStr].length - maxEvents) + ' more</span>';
+                    }
                 }
                 
                 html += '</div>';
@@ -241,26 +251,22 @@ document.addEventListener('DOMContentLoaded', function() {
         
         function fetchEvents(year, month) {
             // Show loading state
-            if (calendarDays) {
-                calendarDays.style.opacity = '0.5';
-            }
+            calendarDays.style.opacity = '0.5';
             
-            fetch('/api/events?year=' + year + '&month=' + month)
-                .then(function(response) {
-                    return response.json();
-                })
+            const shownDate = new Date(currentDate);
+            fetchCalendarEvents(year, month)
                 .then(function(events) {
-                    renderCalendar(currentDate, events);
-                    if (calendarDays) {
-                        calendarDays.style.opacity = '1';
+                    // Ignore responses for a month the user already left
+                    if (calendarMonthKey(shownDate) !== calendarMonthKey(currentDate)) {
+                        return;
                     }
+                    renderCalendar(shownDate, events);
+                    calendarDays.style.opacity = '1';
                 })
                 .catch(function(error) {
                     console.error('Error fetching events:', error);
                     renderCalendar(currentDate, []);
-                    if (calendarDays) {
-                        calendarDays.style.opacity = '1';
-                    }
+                    calendarDays.style.opacity = '1';
                 });
         }
         
@@ -284,9 +290,16 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
         
+        if (todayBtn) {
+            todayBtn.addEventListener('click', function() {
+                currentDate = new Date();
+                loadCalendar();
+            });
+        }
+        
         // Keyboard navigation for calendar
         document.addEventListener('keydown', function(e) {
-            if (document.activeElement && document.activeElement.classList.contains('calendar-day')) {
+            if (document.activeElement && document.activeElement.classList.contains(dayClass)) {
                 if (e.key === 'ArrowLeft') {
                     currentDate.setMonth(currentDate.getMonth() - 1);
                     loadCalendar();
@@ -356,6 +369,55 @@ function resetButtonState(btn) {
     }
 }
 
+// Calendar event cache: 'YYYY-MM' -> Promise of that month's events.
+// Each request also covers the neighbouring months, so paging through the
+// calendar mostly reads from here instead of refetching.
+const calendarCache = {};
+
+function calendarMonthKey(date) {
+    return date.getFullYear() + '-' + String(date.getMonth() + 1).padStart(2, '0');
+}
+
+function calendarIsoDate(date) {
+    return calendarMonthKey(date) + '-' + String(date.getDate()).padStart(2, '0');
+}
+
+function fetchCalendarEvents(year, month) {
+    const missing = [-1, 0, 1].map(function(offset) {
+        return new Date(year, month - 1 + offset, 1);
+    }).filter(function(date) {
+        return !calendarCache[calendarMonthKey(date)];
+    });
+    
+    if (missing.length) {
+        const from = missing[0];
+        const last = missing[missing.length - 1];
+        const to = new Date(last.getFullYear(), last.getMonth() + 1, 1);
+        const request = fetch('/api/events?from=' + calendarIsoDate(from) + '&to=' + calendarIsoDate(to))
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            });
+        
+        missing.forEach(function(date) {
+            const key = calendarMonthKey(date);
+            calendarCache[key] = request.then(function(events) {
+                return events.filter(function(event) {
+                    return event.date.slice(0, 7) === key;
+                });
+            });
+            // Don't cache failures
+            calendarCache[key].catch(function() {
+                delete calendarCache[key];
+            });
+        });
+    }
+    
+    return calendarCache[calendarMonthKey(new Date(year, month - 1, 1))];
+}
+
 // Add slideOut animation
 const style = document.createElement('style');
 style.textContent = '@keyframes slideOut { from { transform: translateX(0); opacity: 1; } to { transform: translateX(100%); opacity: 0; } }';